@@ -0,0 +1,170 @@
+"""
+Archival of finished orders into cold storage.
+
+Delivered and cancelled orders whose last update is older than
+ORDER_ARCHIVE_AFTER_DAYS are moved, in batches, from `orders`/`order_items`
+into `orders_archive`: one row per order with its items serialized as
+compact JSON. The hot tables (and their indexes) then only hold recent and
+still-active orders. Rollups are not touched, so reports keep covering
+archived orders. Sales feed events older than the same cutoff are pruned;
+product-service consumes them within minutes.
+
+Each batch is copied and deleted in one transaction. Rows are claimed with
+FOR UPDATE SKIP LOCKED on Postgres, so several workers can run the archiver
+without archiving the same order twice.
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from database import (
+    SessionLocal, ensure_order_partitions,
+    Order, OrderItem, ArchivedOrder, SalesFeedEvent,
+)
+
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get("ORDER_ARCHIVE_AFTER_DAYS", 90))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get("ARCHIVE_INTERVAL_SECONDS", 3600))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 500))
+ORDER_PARTITION_INTERVAL_SECONDS = float(os.environ.get("ORDER_PARTITION_INTERVAL_SECONDS", 3600))
+
+ARCHIVABLE_STATUSES = ("delivered", "cancelled")
+
+
+def to_archive(order) -> ArchivedOrder:
+    items = [
+        {
+            "product_id": item.product_id,
+            "product_name": item.product_name,
+            "quantity": item.quantity,
+            "price": item.price,
+            "subtotal": item.subtotal,
+        }
+        for item in order.items
+    ]
+    return ArchivedOrder(
+        id=order.id,
+        user_email=order.user_email,
+        total=order.total,
+        status=order.status,
+        items=json.dumps(items, separators=(",", ":")),
+        created_at=order.created_at,
+        updated_at=order.updated_at,
+    )
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to `batch_size` finished orders last updated before `cutoff`; return how many"""
+    db = SessionLocal()
+    try:
+        orders = (
+            db.query(Order)
+            .filter(
+                Order.status.in_(ARCHIVABLE_STATUSES),
+                Order.updated_at < cutoff,
+                # Ids already in the archive would fail the whole batch; report_conflicts logs them
+                ~exists().where(ArchivedOrder.id == Order.id),
+            )
+            .order_by(Order.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .options(selectinload(Order.items))
+            .all()
+        )
+        if not orders:
+            return 0
+
+        ids = [order.id for order in orders]
+        db.add_all(to_archive(order) for order in orders)
+        db.query(OrderItem).filter(OrderItem.order_id.in_(ids)).delete(synchronize_session=False)
+        db.query(Order).filter(Order.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        return len(orders)
+    except IntegrityError as e:
+        # Another worker archived some of these orders first; the next run skips them
+        db.rollback()
+        print(f"Archive batch conflicted, retrying next run: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+def prune_feed_events(cutoff):
+    """Delete old feed events, always keeping the newest so the log never looks un-backfilled"""
+    db = SessionLocal()
+    try:
+        newest = db.query(func.max(SalesFeedEvent.id)).scalar()
+        if newest is None:
+            return
+        db.query(SalesFeedEvent).filter(
+            SalesFeedEvent.recorded_at < cutoff, SalesFeedEvent.id < newest,
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def report_conflicts(cutoff):
+    """Log finished orders left in place because their id is already in the archive.
+
+    SQLite databases created before orders used AUTOINCREMENT can reuse the
+    id of an archived order; those orders need manual attention.
+    """
+    db = SessionLocal()
+    try:
+        conflicts = (
+            db.query(func.count(Order.id))
+            .filter(
+                Order.status.in_(ARCHIVABLE_STATUSES),
+                Order.updated_at < cutoff,
+                exists().where(ArchivedOrder.id == Order.id),
+            )
+            .scalar()
+        )
+        if conflicts:
+            print(f"Not archiving {conflicts} orders whose id is already in orders_archive")
+    finally:
+        db.close()
+
+
+def archive_orders(now=None, batch_size=ARCHIVE_BATCH_SIZE) -> int:
+    """Archive every eligible order, one batch per transaction; return the total moved"""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=ORDER_ARCHIVE_AFTER_DAYS)
+    prune_feed_events(cutoff)
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            report_conflicts(cutoff)
+            return total
+
+
+async def run_archiver():
+    """Background loop archiving orders every ARCHIVE_INTERVAL_SECONDS"""
+    while True:
+        try:
+            moved = await asyncio.to_thread(archive_orders)
+            if moved:
+                print(f"Archived {moved} orders")
+        except Exception as e:
+            print(f"Error archiving orders: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+
+async def run_partition_maintainer():
+    """Background loop adding upcoming orders partitions every ORDER_PARTITION_INTERVAL_SECONDS.
+
+    Independent of the archiver, so partitions stay ahead when archiving is off.
+    """
+    while True:
+        await asyncio.sleep(ORDER_PARTITION_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(ensure_order_partitions)
+        except Exception as e:
+            print(f"Error adding orders partitions: {e}")
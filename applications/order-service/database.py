@@ -1,20 +1,118 @@
+import asyncio
+import itertools
+import json
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, func
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import create_engine, event, text, Column, Integer, String, Float, DateTime, ForeignKey, Index, Text, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base, relationship
+from sqlalchemy.dialects import postgresql, sqlite
+
+from loadshed import DeadlineExceeded, check_deadline, deadline_passed, remaining_time
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./orders.db")
 
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+# Optional comma-separated read replicas; reads fall back to the primary when unset
+DATABASE_REPLICA_URLS = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_CHECK_SECONDS = float(os.environ.get("REPLICA_CHECK_SECONDS", 5))
+REPLICA_RETRY_SECONDS = float(os.environ.get("REPLICA_RETRY_SECONDS", 30))
+
+# Connection pool per engine, per worker process: size the total
+# (workers x capacity) to fit the database's connection limit
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_CAPACITY = DB_POOL_SIZE + DB_MAX_OVERFLOW
+# Postgres connect timeout (whole seconds), so an unreachable host fails fast
+DB_CONNECT_TIMEOUT_SECONDS = int(os.environ.get("DB_CONNECT_TIMEOUT_SECONDS", 3))
+
+
+def make_engine(url):
+    pool_args = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+    # Handle sqlite vs postgres
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False}, **pool_args)
+    return create_engine(
+        url, pool_pre_ping=True, connect_args={"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS}, **pool_args,
+    )
+
+
+engine = make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class ReplicaPool:
+    """Round-robin over read replicas, skipping ones that fail a health probe.
+
+    A replica is probed with SELECT 1 before first use and again once its
+    last successful check is older than `check_seconds`. Failed replicas are
+    skipped for `retry_seconds` before being probed again. Only one request
+    probes a given replica at a time; the others skip it meanwhile.
+    """
+
+    def __init__(self, engines, primary, check_seconds=REPLICA_CHECK_SECONDS, retry_seconds=REPLICA_RETRY_SECONDS):
+        self.engines = engines
+        self.primary = primary
+        self.check_seconds = check_seconds
+        self.retry_seconds = retry_seconds
+        self._healthy_until = {}
+        self._down_until = {}
+        self._probing = set()
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def pick(self):
+        """Return a healthy replica engine, or the primary if none are available"""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            with self._lock:
+                candidate = self.engines[next(self._next) % len(self.engines)]
+                healthy_until = self._healthy_until.get(candidate, 0)
+                probe = healthy_until <= now and self._down_until.get(candidate, 0) <= now \
+                    and candidate not in self._probing
+                if probe:
+                    self._probing.add(candidate)
+            if healthy_until > now:
+                return candidate
+            if probe and self._probe(candidate):
+                return candidate
+        return self.primary
+
+    def mark_down(self, replica):
+        if replica is not self.primary:
+            with self._lock:
+                self._healthy_until.pop(replica, None)
+                self._down_until[replica] = time.monotonic() + self.retry_seconds
+
+    def _probe(self, replica):
+        try:
+            with replica.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except OperationalError:
+            self.mark_down(replica)
+            return False
+        else:
+            with self._lock:
+                self._healthy_until[replica] = time.monotonic() + self.check_seconds
+            return True
+        finally:
+            with self._lock:
+                self._probing.discard(replica)
+
+
+replica_pool = ReplicaPool([make_engine(url) for url in DATABASE_REPLICA_URLS], engine)
 Base = declarative_base()
 
 
 class Order(Base):
     __tablename__ = "orders"
+    # sqlite_autoincrement: ids of archived orders must never be handed out again
+    __table_args__ = (
+        Index("ix_orders_user_email_created_at", "user_email", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_email = Column(String(255), nullable=False, index=True)
@@ -39,9 +137,11 @@ class Order(Base):
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    # Never reuse ids: the sales feed is consumed by item id cursor
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     product_id = Column(Integer, nullable=False)
     product_name = Column(String(255), nullable=False)
     quantity = Column(Integer, nullable=False)
@@ -60,6 +160,31 @@ class OrderItem(Base):
         }
 
 
+class ArchivedOrder(Base):
+    """Cold storage for finished orders: one row per order, items kept as JSON"""
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True)
+    user_email = Column(String(255), nullable=False, index=True)
+    total = Column(Float, nullable=False)
+    status = Column(String(20), nullable=False)
+    items = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, server_default=func.now())
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_email": self.user_email,
+            "items": json.loads(self.items),
+            "total": self.total,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
 class CartItem(Base):
     __tablename__ = "cart_items"
 
@@ -69,8 +194,229 @@ class CartItem(Base):
     quantity = Column(Integer, nullable=False)
 
 
+class SalesFeedEvent(Base):
+    """Append-only log of sales changes, consumed in id order by product-service rankings.
+
+    A new order adds one positive event per item; cancelling it later adds
+    the matching negative events (and un-cancelling adds them back).
+    """
+    __tablename__ = "sales_feed_events"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    subtotal = Column(Float, nullable=False)
+    order_created_at = Column(DateTime, nullable=False)
+    recorded_at = Column(DateTime, nullable=False, index=True)
+
+
+class SalesRollup(Base):
+    """Revenue and order count per hour/day bucket of order creation time"""
+    __tablename__ = "sales_rollups"
+
+    granularity = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    revenue = Column(Float, nullable=False, default=0.0)
+    order_count = Column(Integer, nullable=False, default=0)
+
+
+class ProductSalesRollup(Base):
+    """Units sold and revenue per product per hour/day bucket"""
+    __tablename__ = "product_sales_rollups"
+
+    granularity = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    units_sold = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class StatusRollup(Base):
+    """Current status distribution of the orders created in each hour/day bucket"""
+    __tablename__ = "status_rollups"
+
+    granularity = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    status = Column(String(20), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+
+
+def upsert_increment(db, model, keys, increments):
+    """INSERT a row, or add `increments` to the existing row with the same `keys`"""
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(model).values(**keys, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: getattr(model, column) + stmt.excluded[column] for column in increments},
+    )
+    db.execute(stmt)
+
+
+# On Postgres, orders are range-partitioned by created_at month. The partition
+# key must be part of the primary key, so order_items cannot carry a database
+# foreign key to orders; the ORM relationship is unaffected. Tables that
+# already exist unpartitioned are left as they are.
+POSTGRES_PARTITIONED_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id SERIAL,
+        user_email VARCHAR(255) NOT NULL,
+        total DOUBLE PRECISION NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT now(),
+        updated_at TIMESTAMP DEFAULT now(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_orders_id ON orders (id)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_email ON orders (user_email)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_user_email_created_at ON orders (user_email, created_at)",
+    "CREATE TABLE IF NOT EXISTS orders_default PARTITION OF orders DEFAULT",
+    """
+    CREATE TABLE IF NOT EXISTS order_items (
+        id SERIAL PRIMARY KEY,
+        order_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        product_name VARCHAR(255) NOT NULL,
+        quantity INTEGER NOT NULL,
+        price DOUBLE PRECISION NOT NULL,
+        subtotal DOUBLE PRECISION NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_order_items_id ON order_items (id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+]
+ORDER_PARTITION_MONTHS_AHEAD = int(os.environ.get("ORDER_PARTITION_MONTHS_AHEAD", 2))
+
+
 def init_db():
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            if not conn.execute(text("SELECT to_regclass('orders')")).scalar():
+                for statement in POSTGRES_PARTITIONED_DDL:
+                    conn.execute(text(statement))
     Base.metadata.create_all(bind=engine)
+    ensure_order_partitions()
+
+
+# Serializes partition creation and one-time backfills across workers and
+# instances (arbitrary application-wide key)
+SCHEMA_LOCK_KEY = 7321001
+
+
+def lock_schema(conn):
+    """Hold the schema advisory lock until the current transaction ends; no-op off Postgres.
+
+    `conn` may be a Connection or a Session.
+    """
+    if engine.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+
+def create_order_partition(conn, year, month):
+    """Create the orders partition for one month, moving its rows out of DEFAULT.
+
+    Postgres refuses to add a partition while the DEFAULT partition holds
+    rows in its range (e.g. orders placed before the partition existed), so
+    the partition is built detached, those rows are moved into it and it is
+    then attached, all in the caller's transaction.
+    """
+    name = f"orders_p{year:04d}_{month:02d}"
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    start, end = f"{year:04d}-{month:02d}-01", f"{next_year:04d}-{next_month:02d}-01"
+    lock_schema(conn)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return
+    conn.execute(text(f"CREATE TABLE {name} (LIKE orders INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM orders_default WHERE created_at >= '{start}' AND created_at < '{end}' "
+        f"RETURNING id, user_email, total, status, created_at, updated_at) "
+        f"INSERT INTO {name} (id, user_email, total, status, created_at, updated_at) SELECT * FROM moved"
+    ))
+    conn.execute(text(f"ALTER TABLE orders ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"))
+
+
+def ensure_order_partitions(months_ahead=ORDER_PARTITION_MONTHS_AHEAD, today=None):
+    """Create monthly orders partitions from the current month up to `months_ahead` ahead.
+
+    Older or unexpected dates land in the DEFAULT partition. Each month is
+    created in its own transaction; a failure is logged and the remaining
+    months are still attempted, so startup never fails on it. No-op unless
+    orders is a partitioned Postgres table.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    today = today or datetime.utcnow().date()
+    with engine.connect() as conn:
+        partitioned = conn.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('orders')")
+        ).scalar()
+    if not partitioned:
+        return
+    year, month = today.year, today.month
+    for _ in range(months_ahead + 1):
+        try:
+            with engine.begin() as conn:
+                create_order_partition(conn, year, month)
+        except Exception as e:
+            print(f"Error creating orders partition for {year:04d}-{month:02d}: {e}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def dispose_engines(close=True):
+    """Drop pooled connections for the primary and every replica.
+
+    Call with close=False in a freshly forked worker so it opens its own
+    connections instead of sharing sockets inherited from the parent.
+    """
+    engine.dispose(close=close)
+    for replica in replica_pool.engines:
+        replica.dispose(close=close)
+
+
+class ConnectionLimitMiddleware:
+    """ASGI middleware queueing requests beyond the connection pool's capacity.
+
+    Endpoints run their queries on the event loop and sessions are only closed
+    after the response is sent, so a request that finds the pool exhausted
+    would block the loop - and with it every session close - until
+    pool_timeout. Waiting here instead is non-blocking, and each request that
+    gets through is guaranteed a free connection. `exempt` paths (health
+    checks) do not use the database and never wait.
+    """
+
+    def __init__(self, app, limit=DB_POOL_CAPACITY, exempt=("/health",)):
+        self.app = app
+        self.limit = limit
+        self.exempt = set(exempt)
+        self._semaphore = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        if self._semaphore is None:
+            # Created lazily so it binds to the worker's running event loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        # Give up waiting once the request's deadline has passed
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), remaining_time())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._semaphore.release()
+
+
+@event.listens_for(Session, "after_begin")
+def apply_request_deadline(session, transaction, connection):
+    """Refuse to start a transaction past the request deadline; cap Postgres statements to the time left"""
+    check_deadline()
+    remaining = remaining_time()
+    if remaining is not None and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(remaining * 1000))}")
 
 
 def get_db():
@@ -79,3 +425,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Session for read-only endpoints, routed to a replica when one is configured.
+
+    Read-your-writes paths must keep using get_db so they stay on the primary.
+    """
+    replica = replica_pool.pick()
+    db = SessionLocal(bind=replica)
+    try:
+        yield db
+    except OperationalError:
+        # A statement cancelled by the request deadline says nothing about the replica
+        if not deadline_passed():
+            replica_pool.mark_down(replica)
+        raise
+    finally:
+        db.close()
@@ -3,32 +3,120 @@ Order Service - Shopping cart and order management
 FastAPI microservice that integrates with User and Product services
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
 from enum import Enum
+import asyncio
 import uvicorn
 import os
+import hmac
+import time
 import httpx
 import jwt
+import orjson
 
 from database import (
-    init_db, get_db,
+    init_db, get_db, get_read_db, dispose_engines, ConnectionLimitMiddleware,
     Order as OrderModel,
+    ArchivedOrder as ArchivedOrderModel,
     OrderItem as OrderItemModel,
     CartItem as CartItemModel,
+    SalesFeedEvent as SalesFeedEventModel,
 )
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from streaming import wants_stream, stream_queries
+from ratelimit import Budget, RateLimitMiddleware, create_backend, jwt_subject
+from loadshed import (
+    CRITICAL, LOW, AdaptiveConcurrencyMiddleware, DeadlineMiddleware,
+    DeadlineExceeded, deadline_headers, deadline_passed, request_timeout,
+)
+from rollups import (
+    GRANULARITIES, record_order_created, record_status_change, backfill_rollups, backfill_feed_events, sales_report,
+)
+from archive import ARCHIVE_INTERVAL_SECONDS, ORDER_PARTITION_INTERVAL_SECONDS, run_archiver, run_partition_maintainer
+
+# Shared per-worker client for Product Service calls, created in lifespan
+http_client: Optional[httpx.AsyncClient] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker resources: DB connections, the Product Service client pool and background jobs"""
+    global http_client
+    # Workers forked from a preloading master must not reuse its pooled connections
+    dispose_engines(close=False)
+    if not os.environ.get("DB_PREPARED"):
+        prepare_database()
+    http_client = httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+    background = []
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(run_archiver()))
+    if ORDER_PARTITION_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(run_partition_maintainer()))
+
+    yield
+
+    for task in background:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await http_client.aclose()
+    await rate_limit_backend.close()
+    dispose_engines()
+
 
 app = FastAPI(
     title="Order Service",
     description="Order and shopping cart management API",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+)
+
+# Configuration
+SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-super-secret-key-change-this-in-production")
+ALGORITHM = "HS256"
+
+# Bound in-flight requests by the DB pool (added first so it is innermost and
+# requests rejected by outer middleware never queue for a slot)
+app.add_middleware(ConnectionLimitMiddleware)
+
+# Token buckets for the rate limiter; a Redis backend's connections are closed in lifespan
+rate_limit_backend = create_backend()
+
+# Rate limits (added before CORS so 429 responses still carry CORS headers)
+app.add_middleware(
+    RateLimitMiddleware,
+    rules={
+        ("POST", "/api/cart/add"): Budget(capacity=30, per_seconds=60),
+        ("POST", "/api/orders"): Budget(capacity=10, per_seconds=60),
+    },
+    identify=jwt_subject(SECRET_KEY, ALGORITHM),
+    backend=rate_limit_backend,
 )
 
+# Shed excess requests with 503 before they queue, lowest priority routes first
+app.add_middleware(
+    AdaptiveConcurrencyMiddleware,
+    priorities=[
+        ("GET", "/api/orders/items/feed", LOW),
+        ("POST", "/api/orders", CRITICAL),
+        ("PATCH", "/api/orders/", CRITICAL),
+        ("GET", "/api/storefront", LOW),
+        ("GET", "/api/admin", LOW),
+    ],
+)
+
+# Per-request deadline (X-Request-Deadline); outermost before CORS so overruns become 504s
+app.add_middleware(DeadlineMiddleware)
+
 # CORS configuration
 CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "http://localhost:8080,http://localhost:3000").split(",")
 app.add_middleware(
@@ -39,13 +127,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuration
-SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-super-secret-key-change-this-in-production")
-ALGORITHM = "HS256"
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY", "change-this-admin-key")
+# Shared with product-service, which presents it to read the sales feed
+SERVICE_API_KEY = os.environ.get("SERVICE_API_KEY", "change-this-service-key")
+# How long a cart pricing snapshot can stand in for re-fetching products at checkout
+PRICING_SNAPSHOT_TTL_SECONDS = int(os.environ.get("PRICING_SNAPSHOT_TTL_SECONDS", 900))
+# How long each worker reuses the shared (non-cart) part of the storefront payload
+STOREFRONT_CACHE_SECONDS = float(os.environ.get("STOREFRONT_CACHE_SECONDS", 30))
+# While Product Service fails, how long the last complete payload is served before retrying
+STOREFRONT_RETRY_SECONDS = float(os.environ.get("STOREFRONT_RETRY_SECONDS", 5))
+
+# Service integrations
 PRODUCT_SERVICE_URL = os.environ.get("PRODUCT_SERVICE_URL", "http://localhost:8001")
 USER_SERVICE_URL = os.environ.get("USER_SERVICE_URL", "http://localhost:8003")
+# Feed events younger than this are held back so that events committed
+# slightly out of id order are not skipped by the consumer's cursor
+FEED_SETTLE_SECONDS = int(os.environ.get("FEED_SETTLE_SECONDS", 10))
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 # Enums
@@ -62,6 +162,9 @@ class CartItemSchema(BaseModel):
     product_id: int
     quantity: int
 
+class CheckoutSchema(BaseModel):
+    pricing_snapshot: Optional[str] = None
+
 class OrderItemSchema(BaseModel):
     product_id: int
     product_name: str
@@ -94,22 +197,230 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Email of a signed-in caller, or None for anonymous or invalid tokens"""
+    if credentials is None:
+        return None
+    try:
+        return await verify_token(credentials)
+    except HTTPException:
+        return None
+
+def naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC; convert timezone-aware input to match"""
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+async def verify_admin(x_admin_key: Optional[str] = Header(None)):
+    """Require the shared admin key (X-Admin-Key) for reporting endpoints"""
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+async def verify_service(x_service_key: Optional[str] = Header(None)):
+    """Require the service-to-service key (X-Service-Key) for internal feeds"""
+    if not x_service_key or not hmac.compare_digest(x_service_key, SERVICE_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid service key")
+
+async def product_service_get(path: str, params=None):
+    """GET from Product Service, forwarding the request deadline and timing out with it"""
+    try:
+        return await http_client.get(
+            f"{PRODUCT_SERVICE_URL}{path}", params=params,
+            headers=deadline_headers(), timeout=request_timeout(10.0),
+        )
+    except httpx.TimeoutException:
+        if deadline_passed():
+            raise DeadlineExceeded()
+        raise
+
 async def get_product(product_id: int):
     """Fetch product details from Product Service"""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{PRODUCT_SERVICE_URL}/api/products/{product_id}")
-            if response.status_code == 200:
-                return response.json()
-            return None
-        except Exception as e:
-            print(f"Error fetching product {product_id}: {e}")
-            return None
-
-
-@app.on_event("startup")
-def on_startup():
+    try:
+        response = await product_service_get(f"/api/products/{product_id}")
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code in (503, 504):
+            # Overloaded upstream: pass the back-pressure on instead of reporting a missing product
+            raise HTTPException(status_code=503, detail="Product Service unavailable", headers={"Retry-After": "1"})
+        return None
+    except (DeadlineExceeded, HTTPException):
+        raise
+    except Exception as e:
+        print(f"Error fetching product {product_id}: {e}")
+        return None
+
+async def get_product_versions(product_ids):
+    """Current product versions from Product Service in one call; {} if unavailable"""
+    try:
+        response = await product_service_get("/api/products/versions", params={"ids": product_ids})
+        if response.status_code == 200:
+            return {int(pid): version for pid, version in response.json()["versions"].items()}
+        return {}
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error checking product versions: {e}")
+        return {}
+
+async def get_current_products(product_ids):
+    """Products by id from Product Service's primary, for pricing checkout; {} if unavailable"""
+    try:
+        response = await product_service_get("/api/products/current", params={"ids": product_ids})
+        if response.status_code == 200:
+            return {p["id"]: p for p in response.json()}
+        if response.status_code in (503, 504):
+            raise HTTPException(status_code=503, detail="Product Service unavailable", headers={"Retry-After": "1"})
+        return {}
+    except (DeadlineExceeded, HTTPException):
+        raise
+    except Exception as e:
+        print(f"Error fetching current products: {e}")
+        return {}
+
+# Product fields a pricing snapshot carries per cart line
+SNAPSHOT_FIELDS = ("id", "name", "price", "in_stock", "version")
+# Audience claim keeping snapshots from being accepted as access tokens (which carry no audience)
+SNAPSHOT_AUDIENCE = "pricing-snapshot"
+
+def sign_pricing_snapshot(user_email: str, products):
+    """Signed token of the prices and versions the cart was just priced at"""
+    payload = {
+        "sub": user_email,
+        "aud": SNAPSHOT_AUDIENCE,
+        "lines": [{field: p[field] for field in SNAPSHOT_FIELDS} for p in products],
+        "exp": datetime.utcnow() + timedelta(seconds=PRICING_SNAPSHOT_TTL_SECONDS),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+def read_pricing_snapshot(snapshot: str, user_email: str):
+    """Snapshot lines by product id, or {} if the snapshot is invalid, expired or someone else's"""
+    try:
+        payload = jwt.decode(snapshot, SECRET_KEY, algorithms=[ALGORITHM], audience=SNAPSHOT_AUDIENCE)
+    except jwt.PyJWTError:
+        return {}
+    if payload.get("sub") != user_email:
+        return {}
+    return {line["id"]: line for line in payload.get("lines", [])}
+
+async def price_cart(user_email: str, cart_items, known_products=None, hydrate=False):
+    """Cart lines, total and a pricing snapshot.
+
+    Products not in `known_products` (by id) are fetched concurrently. With
+    `hydrate`, each line also carries its product details.
+    """
+    known_products = known_products or {}
+    missing = [ci.product_id for ci in cart_items if ci.product_id not in known_products]
+    fetched = dict(zip(missing, await asyncio.gather(*(get_product(pid) for pid in missing))))
+    products = [known_products.get(ci.product_id) or fetched.get(ci.product_id) for ci in cart_items]
+
+    total = 0.0
+    items = []
+    for ci, prod in zip(cart_items, products):
+        if prod:
+            total += prod["price"] * ci.quantity
+        item = {"product_id": ci.product_id, "quantity": ci.quantity}
+        if hydrate:
+            item["product"] = prod
+        items.append(item)
+    snapshot = sign_pricing_snapshot(user_email, [p for p in products if p and "version" in p])
+    return {"items": items, "total": total, "pricing_snapshot": snapshot}
+
+async def resolve_cart_products(user_email: str, product_ids, snapshot: Optional[str]):
+    """Products for checkout by id, reusing snapshot lines whose version is still current.
+
+    Only lines missing from the snapshot or changed since it was signed are
+    re-fetched, from Product Service's primary so a lagging replica cannot
+    supply an old price; without a usable snapshot every product is fetched.
+    A fetched product older than the version just checked is rejected with 409.
+    """
+    lines = read_pricing_snapshot(snapshot, user_email) if snapshot else {}
+    snapshotted = [pid for pid in product_ids if pid in lines]
+    current = await get_product_versions(snapshotted) if snapshotted else {}
+
+    products = {}
+    stale = []
+    for pid in product_ids:
+        if pid in lines and current.get(pid) == lines[pid]["version"]:
+            products[pid] = lines[pid]
+        else:
+            stale.append(pid)
+    fetched = await get_current_products(stale) if stale else {}
+    for pid, product in fetched.items():
+        if product.get("version", 0) < current.get(pid, 0):
+            raise HTTPException(status_code=409, detail=f"Product {pid} changed during checkout, please retry")
+        products[pid] = product
+    return products
+
+async def get_product_service_json(path: str):
+    """GET a Product Service endpoint; None on any failure"""
+    try:
+        response = await product_service_get(path)
+        if response.status_code == 200:
+            return response.json()
+        return None
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error fetching {path}: {e}")
+        return None
+
+_storefront_cache = {"expires": 0.0, "catalog": None, "body": None, "fresh": False}
+_storefront_lock = asyncio.Lock()
+
+def _cached_storefront():
+    return _storefront_cache["catalog"], _storefront_cache["body"], _storefront_cache["fresh"]
+
+async def storefront_catalog():
+    """Shared home page data as (catalog, serialized anonymous body, fresh), cached per worker.
+
+    The four Product Service calls run concurrently. If any of them fails, the
+    last complete payload is served instead (`fresh` False) and retried after
+    STOREFRONT_RETRY_SECONDS; with none to fall back on, 503. A payload with
+    missing sections is never returned.
+    """
+    if _storefront_cache["expires"] > time.monotonic():
+        return _cached_storefront()
+
+    async with _storefront_lock:
+        # Concurrent misses wait here and reuse the first one's result
+        if _storefront_cache["expires"] > time.monotonic():
+            return _cached_storefront()
+
+        products, new_arrivals, bestsellers, brands = await asyncio.gather(
+            get_product_service_json("/api/products"),
+            get_product_service_json("/api/products/featured/new"),
+            get_product_service_json("/api/products/featured/bestsellers"),
+            get_product_service_json("/api/brands"),
+        )
+        if None in (products, new_arrivals, bestsellers, brands):
+            if _storefront_cache["catalog"] is None:
+                raise HTTPException(status_code=503, detail="Product Service unavailable", headers={"Retry-After": "1"})
+            _storefront_cache.update(expires=time.monotonic() + STOREFRONT_RETRY_SECONDS, fresh=False)
+            return _cached_storefront()
+
+        catalog = {
+            "products": products,
+            "new_arrivals": new_arrivals,
+            "bestsellers": bestsellers,
+            "brands": brands.get("brands", []),
+        }
+        body = orjson.dumps({**catalog, "cart": None})
+        _storefront_cache.update(
+            expires=time.monotonic() + STOREFRONT_CACHE_SECONDS, catalog=catalog, body=body, fresh=True,
+        )
+        return _cached_storefront()
+
+
+def prepare_database():
+    """Create tables and backfill rollups and the sales feed; runs once per deployment, before workers fork"""
     init_db()
+    db = next(get_db())
+    try:
+        backfill_rollups(db)
+        backfill_feed_events(db)
+    finally:
+        db.close()
 
 
 # Health check
@@ -150,36 +461,27 @@ async def add_to_cart(
 
     db.commit()
 
-    # Calculate total
     cart_items = db.query(CartItemModel).filter(CartItemModel.user_email == user_email).all()
-    total = 0.0
-    items_out = []
-    for ci in cart_items:
-        prod = await get_product(ci.product_id)
-        if prod:
-            total += prod["price"] * ci.quantity
-        items_out.append({"product_id": ci.product_id, "quantity": ci.quantity})
-
-    return {"message": "Item added to cart", "cart": {"items": items_out, "total": total}}
+    return {"message": "Item added to cart", "cart": await price_cart(user_email, cart_items)}
 
 # Get cart
 @app.get("/api/cart")
-async def get_cart(user_email: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """Get current shopping cart"""
+async def get_cart(
+    hydrate: bool = False,
+    user_email: str = Depends(verify_token),
+    db: Session = Depends(get_db),
+):
+    """Get current shopping cart; `hydrate=true` adds product details to each line.
+
+    `pricing_snapshot` is a signed record of the prices and product versions
+    used; pass it back to `POST /api/orders` to skip re-fetching unchanged lines.
+    """
     cart_items = db.query(CartItemModel).filter(CartItemModel.user_email == user_email).all()
 
     if not cart_items:
-        return {"items": [], "total": 0.0}
+        return {"items": [], "total": 0.0, "pricing_snapshot": None}
 
-    total = 0.0
-    items = []
-    for ci in cart_items:
-        prod = await get_product(ci.product_id)
-        if prod:
-            total += prod["price"] * ci.quantity
-        items.append({"product_id": ci.product_id, "quantity": ci.quantity})
-
-    return {"items": items, "total": total}
+    return await price_cart(user_email, cart_items, hydrate=hydrate)
 
 # Clear cart
 @app.delete("/api/cart")
@@ -191,18 +493,29 @@ async def clear_cart(user_email: str = Depends(verify_token), db: Session = Depe
 
 # Create order from cart
 @app.post("/api/orders", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
-async def create_order(user_email: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """Create order from current cart"""
+async def create_order(
+    checkout: Optional[CheckoutSchema] = None,
+    user_email: str = Depends(verify_token),
+    db: Session = Depends(get_db),
+):
+    """Create order from current cart.
+
+    With the cart's `pricing_snapshot`, prices are confirmed by a single
+    version check and only changed products are fetched again.
+    """
     cart_items = db.query(CartItemModel).filter(CartItemModel.user_email == user_email).all()
 
     if not cart_items:
         raise HTTPException(status_code=400, detail="Cart is empty")
 
+    products = await resolve_cart_products(
+        user_email, [ci.product_id for ci in cart_items], checkout.pricing_snapshot if checkout else None,
+    )
     order_items = []
     total = 0.0
 
     for ci in cart_items:
-        product = await get_product(ci.product_id)
+        product = products.get(ci.product_id)
         if not product:
             raise HTTPException(status_code=400, detail=f"Product {ci.product_id} not found")
 
@@ -224,6 +537,7 @@ async def create_order(user_email: str = Depends(verify_token), db: Session = De
         user_email=user_email,
         total=total,
         status=OrderStatus.PENDING.value,
+        created_at=datetime.utcnow(),
     )
     db.add(order)
     db.flush()  # Get the order ID
@@ -232,6 +546,8 @@ async def create_order(user_email: str = Depends(verify_token), db: Session = De
         oi.order_id = order.id
         db.add(oi)
 
+    record_order_created(db, order, order_items)
+
     # Clear cart
     db.query(CartItemModel).filter(CartItemModel.user_email == user_email).delete()
 
@@ -240,18 +556,109 @@ async def create_order(user_email: str = Depends(verify_token), db: Session = De
 
     return order.to_dict()
 
+# Storefront page payload (backend-for-frontend)
+@app.get("/api/storefront")
+async def get_storefront(user_email: Optional[str] = Depends(optional_user), db: Session = Depends(get_db)):
+    """Everything the home page needs in one response.
+
+    Returns the catalog, new arrivals, bestsellers and brands, plus the caller's
+    cart with product details when a valid bearer token is sent. Fresh
+    anonymous responses are identical for everyone and may be cached by
+    shared caches; stale fallbacks and signed-in responses are not.
+    """
+    catalog, anonymous_body, fresh = await storefront_catalog()
+    if user_email is None:
+        cache_control = f"public, max-age={int(STOREFRONT_CACHE_SECONDS)}" if fresh else "private, no-store"
+        return Response(anonymous_body, media_type="application/json", headers={
+            "Cache-Control": cache_control,
+            "Vary": "Authorization",
+        })
+
+    cart_items = db.query(CartItemModel).filter(CartItemModel.user_email == user_email).all()
+    known_products = {p["id"]: p for p in catalog["products"]}
+    cart = await price_cart(user_email, cart_items, known_products, hydrate=True)
+    return Response(orjson.dumps({**catalog, "cart": cart}), media_type="application/json", headers={
+        "Cache-Control": "private, no-store",
+        "Vary": "Authorization",
+    })
+
 # Get user's orders
 @app.get("/api/orders", response_model=List[OrderSchema])
-async def get_orders(user_email: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """Get all orders for current user"""
-    orders = db.query(OrderModel).filter(OrderModel.user_email == user_email).all()
-    return [o.to_dict() for o in orders]
+async def get_orders(
+    request: Request,
+    include_archived: bool = False,
+    user_email: str = Depends(verify_token),
+    db: Session = Depends(get_read_db),
+):
+    """Get orders for current user, newest first.
+
+    Only active and recently finished orders are returned unless
+    `include_archived=true`, in which case archived orders follow them.
+    Send `Accept: application/x-ndjson` to stream one order per line.
+    """
+    query = (
+        db.query(OrderModel)
+        .filter(OrderModel.user_email == user_email)
+        .order_by(OrderModel.created_at.desc())
+    )
+    parts = [(query.options(selectinload(OrderModel.items)), OrderModel.to_dict)]
+    if include_archived:
+        archived = (
+            db.query(ArchivedOrderModel)
+            .filter(ArchivedOrderModel.user_email == user_email)
+            .order_by(ArchivedOrderModel.created_at.desc())
+        )
+        parts.append((archived, ArchivedOrderModel.to_dict))
+
+    if wants_stream(request):
+        return stream_queries(parts)
+    return [row.to_dict() for part, _ in parts for row in part.all()]
+
+# Sales feed consumed by product-service rankings
+@app.get("/api/orders/items/feed", dependencies=[Depends(verify_service)])
+async def get_order_items_feed(
+    after_id: int = 0,
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    """Sales feed events with id > after_id, oldest first, without customer details.
+
+    Each event adds `quantity` units and `subtotal` revenue to a product for an
+    order created at `created_at`. Cancelling an already-fed order emits
+    negative events, so summing the feed always matches current sales.
+    """
+    settled_before = datetime.utcnow() - timedelta(seconds=FEED_SETTLE_SECONDS)
+    events = (
+        db.query(SalesFeedEventModel)
+        .filter(SalesFeedEventModel.id > after_id)
+        .order_by(SalesFeedEventModel.id)
+        .limit(limit)
+        .all()
+    )
+
+    items = []
+    last_id = after_id
+    for event in events:
+        if event.recorded_at > settled_before:
+            break
+        last_id = event.id
+        items.append({
+            "id": event.id,
+            "product_id": event.product_id,
+            "quantity": event.quantity,
+            "subtotal": event.subtotal,
+            "created_at": event.order_created_at,
+        })
+
+    return {"items": items, "last_id": last_id, "has_more": len(events) == limit and last_id == events[-1].id}
 
 # Get specific order
 @app.get("/api/orders/{order_id}", response_model=OrderSchema)
-async def get_order(order_id: int, user_email: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """Get specific order details"""
+async def get_order(order_id: int, user_email: str = Depends(verify_token), db: Session = Depends(get_read_db)):
+    """Get specific order details, falling back to the archive for old finished orders"""
     order = db.query(OrderModel).filter(OrderModel.id == order_id).first()
+    if not order:
+        order = db.get(ArchivedOrderModel, order_id)
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -265,17 +672,38 @@ async def get_order(order_id: int, user_email: str = Depends(verify_token), db:
 @app.patch("/api/orders/{order_id}/status")
 async def update_order_status(order_id: int, new_status: OrderStatus, db: Session = Depends(get_db)):
     """Update order status"""
-    order = db.query(OrderModel).filter(OrderModel.id == order_id).first()
+    # Lock the row so concurrent updates apply their rollup deltas in order
+    order = db.query(OrderModel).filter(OrderModel.id == order_id).with_for_update().first()
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    record_status_change(db, order, order.status, new_status.value)
     order.status = new_status.value
     db.commit()
     db.refresh(order)
 
     return {"message": "Order status updated", "order": order.to_dict()}
 
+# Sales reports served from rollups
+@app.get("/api/admin/reports", dependencies=[Depends(verify_admin)])
+async def get_sales_report(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = Query("day", regex="^(" + "|".join(GRANULARITIES) + ")$"),
+    top_products: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+):
+    """Revenue, order count, units per product and status distribution for [start, end).
+
+    Defaults to the last 30 days. Answered from hourly/daily rollups, never from raw orders.
+    """
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return sales_report(db, granularity, start, end, top_products)
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -291,5 +719,16 @@ async def root():
     }
 
 if __name__ == "__main__":
+    # Production runs under gunicorn (see gunicorn_conf.py); this is the dev server
     port = int(os.environ.get("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 8))
+    if workers > 1:
+        prepare_database()
+        dispose_engines()
+        os.environ["DB_PREPARED"] = "1"
+    uvicorn.run(
+        "main:app" if workers > 1 else app,
+        host="0.0.0.0", port=port, workers=workers,
+        timeout_graceful_shutdown=graceful_timeout,
+    )
@@ -0,0 +1,198 @@
+"""
+Token-bucket rate limiting shared by all services.
+
+Each limited route has a Budget: a bucket of `capacity` tokens refilled
+evenly over `per_seconds`. Requests are keyed by JWT subject when the caller
+presents a valid token, otherwise by client IP. Buckets live in process
+memory by default, or in Redis (RATE_LIMIT_BACKEND=redis) so that every
+Cloud Run instance shares the same budgets.
+"""
+
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# Proxies in front of the service that append to X-Forwarded-For (the Cloud Run front end is one)
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", 1))
+
+
+class Budget(NamedTuple):
+    capacity: float
+    per_seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+
+class MemoryBackend:
+    """Per-process buckets, evicting the least recently used beyond `max_keys`"""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def consume(self, key: str, budget: Budget) -> float:
+        """Take one token; return 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (budget.capacity, now))
+        tokens = min(budget.capacity, tokens + (now - updated) * budget.rate)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / budget.rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    async def close(self):
+        pass
+
+
+# KEYS[1] = bucket key; ARGV = capacity, rate (tokens/s), now (s)
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+class RedisBackend:
+    """Buckets shared across instances through any Redis-protocol server.
+
+    The refill-and-take step runs as one Lua script, so concurrent instances
+    cannot both spend the same token. If Redis is unreachable requests are
+    allowed rather than failing the whole service.
+    """
+
+    def __init__(self, url=REDIS_URL, prefix="ratelimit:"):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package")
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def consume(self, key: str, budget: Budget) -> float:
+        try:
+            retry_after = await self._script(
+                keys=[self.prefix + key],
+                args=[budget.capacity, budget.rate, time.time()],
+            )
+        except redis.RedisError as e:
+            print(f"Rate limiter unavailable, allowing request: {e}")
+            return 0.0
+        return float(retry_after)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def create_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+def client_ip(scope, trusted_proxies=TRUSTED_PROXY_COUNT) -> str:
+    """Client address as seen by the outermost trusted proxy, else the peer address.
+
+    Each proxy appends the address it received the request from, so only the
+    last `trusted_proxies` X-Forwarded-For entries can be trusted; anything
+    before them was sent by the client and is ignored.
+    """
+    hops = []
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            hops += [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+    if trusted_proxies > 0 and len(hops) >= trusted_proxies:
+        return hops[-trusted_proxies]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def jwt_subject(secret_key: str, algorithm: str):
+    """Identify callers by the `sub` of a valid bearer token"""
+    import jwt
+
+    def identify(scope):
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer":
+                    return None
+                try:
+                    return jwt.decode(token, secret_key, algorithms=[algorithm]).get("sub")
+                except jwt.PyJWTError:
+                    return None
+        return None
+
+    return identify
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying per-route token-bucket budgets.
+
+    `rules` maps (method, path) to a Budget; other routes are not limited.
+    """
+
+    def __init__(self, app, rules, backend=None, identify=None):
+        self.app = app
+        self.rules = rules
+        self.backend = backend or create_backend()
+        self.identify = identify
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.rules.get((scope["method"], scope["path"]))
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        subject = self.identify(scope) if self.identify else None
+        caller = f"user:{subject}" if subject else f"ip:{client_ip(scope)}"
+        retry_after = await self.backend.consume(f"{scope['method']}:{scope['path']}:{caller}", budget)
+        if retry_after <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        body = b'{"detail":"Too many requests"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,208 @@
+"""
+Pre-aggregated order rollups for reporting, and the sales feed event log.
+
+Hourly and daily buckets (by order creation time) are updated in the same
+transaction as the order write, so reports read a handful of rollup rows
+instead of scanning `orders` and `order_items`:
+
+- sales_rollups: revenue and order count, excluding cancelled orders
+- product_sales_rollups: units sold and revenue per product, excluding cancelled orders
+- status_rollups: how many of the bucket's orders are currently in each status
+
+The same hooks append to `sales_feed_events`, the change log product-service
+folds into its bestseller rankings.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import func, text
+
+from database import (
+    upsert_increment, lock_schema,
+    Order, OrderItem, SalesFeedEvent, SalesRollup, ProductSalesRollup, StatusRollup,
+)
+
+CANCELLED = "cancelled"
+
+GRANULARITIES = {
+    "hour": lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+    "day": lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+
+def _add_sales(db, order, items, sign):
+    for granularity, truncate in GRANULARITIES.items():
+        bucket = truncate(order.created_at)
+        upsert_increment(db, SalesRollup, {"granularity": granularity, "bucket_start": bucket},
+                         {"revenue": sign * order.total, "order_count": sign})
+        for item in items:
+            upsert_increment(
+                db, ProductSalesRollup,
+                {"granularity": granularity, "bucket_start": bucket, "product_id": item.product_id},
+                {"units_sold": sign * item.quantity, "revenue": sign * item.subtotal},
+            )
+
+
+def _add_feed_events(db, order, items, sign):
+    recorded_at = datetime.utcnow()
+    db.add_all(
+        SalesFeedEvent(
+            product_id=item.product_id,
+            quantity=sign * item.quantity,
+            subtotal=sign * item.subtotal,
+            order_created_at=order.created_at,
+            recorded_at=recorded_at,
+        )
+        for item in items
+    )
+
+
+def _add_status(db, order, status, sign):
+    for granularity, truncate in GRANULARITIES.items():
+        upsert_increment(
+            db, StatusRollup,
+            {"granularity": granularity, "bucket_start": truncate(order.created_at), "status": status},
+            {"order_count": sign},
+        )
+
+
+def record_order_created(db, order, items):
+    """Count a new order; call before committing the order"""
+    if order.status != CANCELLED:
+        _add_sales(db, order, items, 1)
+        _add_feed_events(db, order, items, 1)
+    _add_status(db, order, order.status, 1)
+
+
+def record_status_change(db, order, old_status, new_status):
+    """Move an order between statuses; cancelling removes its sales, un-cancelling restores them"""
+    if old_status == new_status:
+        return
+    _add_status(db, order, old_status, -1)
+    _add_status(db, order, new_status, 1)
+    if new_status == CANCELLED:
+        _add_sales(db, order, order.items, -1)
+        _add_feed_events(db, order, order.items, -1)
+    elif old_status == CANCELLED:
+        _add_sales(db, order, order.items, 1)
+        _add_feed_events(db, order, order.items, 1)
+
+
+def backfill_rollups(db, batch_size=500):
+    """One-time fill from existing orders when the rollup tables are first created.
+
+    Every recorded order writes status rows (sales rows are skipped for
+    cancelled orders), so existing status rows mean the backfill already ran.
+    The schema lock keeps instances starting together from both running it.
+    """
+    lock_schema(db)
+    if db.query(StatusRollup).first() is not None or db.query(Order).first() is None:
+        db.rollback()
+        return
+    for order in db.query(Order).yield_per(batch_size):
+        record_order_created(db, order, order.items)
+    db.commit()
+
+
+def backfill_feed_events(db, batch_size=500):
+    """One-time fill of the sales feed from existing order items.
+
+    Earlier releases fed order items directly and consumers keep their
+    cursor as an item id, so existing items keep their id as event id and
+    new events are numbered after the highest item id. Runs under the
+    schema lock, like backfill_rollups.
+    """
+    lock_schema(db)
+    if db.query(SalesFeedEvent).first() is not None:
+        db.rollback()
+        return
+    max_item_id = db.query(func.max(OrderItem.id)).scalar()
+    if max_item_id is None:
+        db.rollback()
+        return
+
+    rows = (
+        db.query(OrderItem, Order.created_at)
+        .join(Order, Order.id == OrderItem.order_id)
+        .filter(Order.status != CANCELLED)
+        .order_by(OrderItem.id)
+        .yield_per(batch_size)
+    )
+    for item, created_at in rows:
+        db.add(SalesFeedEvent(
+            id=item.id, product_id=item.product_id, quantity=item.quantity, subtotal=item.subtotal,
+            order_created_at=created_at, recorded_at=created_at,
+        ))
+    db.flush()
+
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT setval(pg_get_serial_sequence('sales_feed_events', 'id'), :id)"), {"id": max_item_id})
+    else:
+        db.execute(text("DELETE FROM sqlite_sequence WHERE name = 'sales_feed_events'"))
+        db.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('sales_feed_events', :id)"), {"id": max_item_id})
+    db.commit()
+
+
+def sales_report(db, granularity, start, end, top_products=10):
+    """Totals, time series, top products and status distribution for buckets in [start, end)"""
+    truncate = GRANULARITIES[granularity]
+    start = truncate(start)
+
+    series = (
+        db.query(SalesRollup)
+        .filter(
+            SalesRollup.granularity == granularity,
+            SalesRollup.bucket_start >= start,
+            SalesRollup.bucket_start < end,
+        )
+        .order_by(SalesRollup.bucket_start)
+        .all()
+    )
+
+    products = (
+        db.query(
+            ProductSalesRollup.product_id,
+            func.sum(ProductSalesRollup.units_sold).label("units_sold"),
+            func.sum(ProductSalesRollup.revenue).label("revenue"),
+        )
+        .filter(
+            ProductSalesRollup.granularity == granularity,
+            ProductSalesRollup.bucket_start >= start,
+            ProductSalesRollup.bucket_start < end,
+        )
+        .group_by(ProductSalesRollup.product_id)
+        .all()
+    )
+    products = [p for p in products if p.units_sold > 0]
+    products.sort(key=lambda p: (p.units_sold, p.revenue), reverse=True)
+
+    statuses = (
+        db.query(StatusRollup.status, func.sum(StatusRollup.order_count))
+        .filter(
+            StatusRollup.granularity == granularity,
+            StatusRollup.bucket_start >= start,
+            StatusRollup.bucket_start < end,
+        )
+        .group_by(StatusRollup.status)
+        .all()
+    )
+
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "totals": {
+            "revenue": round(sum(row.revenue for row in series), 2),
+            "order_count": sum(row.order_count for row in series),
+            "units_sold": sum(p.units_sold for p in products),
+        },
+        "series": [
+            {"bucket_start": row.bucket_start, "revenue": round(row.revenue, 2), "order_count": row.order_count}
+            for row in series if row.order_count
+        ],
+        "top_products": [
+            {"product_id": p.product_id, "units_sold": p.units_sold, "revenue": round(p.revenue, 2)}
+            for p in products[:top_products]
+        ],
+        "status_distribution": {status: count for status, count in statuses if count},
+    }
@@ -0,0 +1,168 @@
+"""
+Negotiated response compression with a cache of pre-compressed payloads.
+
+Picks brotli, zstd or gzip from the client's Accept-Encoding (brotli and zstd
+only when their packages are installed) and compresses complete responses
+above a size threshold. Streaming responses pass through untouched.
+
+For cacheable paths the compressed bytes are cached under a digest of the
+uncompressed body, so an unchanged catalog payload is compressed once (at a
+higher level) and served from memory afterwards. Keying by content means the
+cache can never serve stale bytes.
+"""
+
+import gzip
+import hashlib
+import os
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_CACHE_BYTES = int(os.environ.get("COMPRESS_CACHE_BYTES", 8 * 1024 * 1024))
+
+# (per-request level, cached level) for each encoding
+COMPRESSORS = {"gzip": (lambda body, level: gzip.compress(body, compresslevel=level), 6, 9)}
+if brotli is not None:
+    COMPRESSORS["br"] = (lambda body, level: brotli.compress(body, quality=level), 4, 9)
+if zstandard is not None:
+    COMPRESSORS["zstd"] = (lambda body, level: zstandard.ZstdCompressor(level=level).compress(body), 3, 12)
+
+# Server preference when the client accepts several encodings equally
+PREFERENCE = ["br", "zstd", "gzip"]
+
+
+def negotiate(accept_encoding: str):
+    """Best supported encoding from an Accept-Encoding header, or None"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for name in PREFERENCE:
+        if name not in COMPRESSORS:
+            continue
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressedCache:
+    """LRU of compressed payloads bounded by total size in bytes"""
+
+    def __init__(self, max_bytes=COMPRESS_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete responses over `minimum_size` bytes"""
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_SIZE, cacheable_paths=(), cache=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cacheable_paths = tuple(cacheable_paths)
+        self.cache = cache if cache is not None else CompressedCache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        cacheable = scope["method"] == "GET" and scope["path"].startswith(self.cacheable_paths)
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                if any(name.lower() == b"content-encoding" for name, _ in message.get("headers", [])):
+                    passthrough = True
+                    await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or small response: send as-is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = self._compress(body, encoding, cacheable and start_message["status"] == 200)
+            vary = [b"Accept-Encoding"]
+            response_headers = []
+            for name, value in start_message.get("headers", []):
+                if name.lower() == b"vary":
+                    vary.insert(0, value)
+                elif name.lower() != b"content-length":
+                    response_headers.append((name, value))
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join(vary)),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compress(self, body, encoding, cacheable):
+        compress, level, cached_level = COMPRESSORS[encoding]
+        if not cacheable:
+            return compress(body, level)
+
+        key = (hashlib.sha256(body).digest(), encoding)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = compress(body, cached_level)
+            self.cache.put(key, compressed)
+        return compressed
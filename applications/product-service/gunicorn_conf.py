@@ -0,0 +1,44 @@
+"""
+Gunicorn settings for the production server.
+
+Runs one Uvicorn worker per available CPU. The app is preloaded in the master
+so workers share its imported code pages copy-on-write; each worker then opens
+its own DB connections, HTTP clients and caches in the app's lifespan.
+"""
+
+import os
+
+
+def available_cpus() -> int:
+    """CPUs granted by the cgroup quota (Cloud Run), falling back to the host count"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", available_cpus()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Cloud Run sends SIGTERM and kills the container 10s later: stop accepting
+# connections and give in-flight requests up to GRACEFUL_TIMEOUT to finish
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 8))
+timeout = 60
+keepalive = 5
+accesslog = "-"
+
+
+def on_starting(server):
+    """Create tables (and seed data) once in the master, before workers fork"""
+    import main
+    from database import dispose_engines
+
+    main.prepare_database()
+    dispose_engines()
+    os.environ["DB_PREPARED"] = "1"
@@ -0,0 +1,216 @@
+"""
+Request deadlines and adaptive load shedding shared by all services.
+
+Deadlines: every request carries an absolute deadline in the
+X-Request-Deadline header (Unix epoch milliseconds). The first service to
+see a request sets it to now + REQUEST_TIMEOUT_SECONDS when the edge did not,
+and a caller's deadline is never extended. The deadline lives in a context
+variable for the rest of the request: outgoing service calls forward it and
+size their timeouts from it, and the database layer refuses to start
+transactions past it and caps Postgres statements to the time left. Work
+that overruns its deadline is answered with 504.
+
+Load shedding: each worker admits at most `limit` concurrent requests and
+answers the rest with 503 immediately instead of queueing them. The limit
+adapts AIMD-style: it grows by one per window of fast responses and shrinks
+by LOADSHED_BACKOFF when responses get slower than LOADSHED_TARGET_SECONDS or
+hit their deadline. Routes have a priority; lower priorities may only use a
+share of the limit, so catalog browsing and user listings are shed well
+before checkout.
+"""
+
+import contextvars
+import math
+import os
+import time
+
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", 10))
+DEADLINE_HEADER = "x-request-deadline"
+
+LOADSHED_ENABLED = os.environ.get("LOADSHED_ENABLED", "true").lower() == "true"
+LOADSHED_INITIAL_LIMIT = int(os.environ.get("LOADSHED_INITIAL_LIMIT", 50))
+LOADSHED_MIN_LIMIT = int(os.environ.get("LOADSHED_MIN_LIMIT", 4))
+LOADSHED_MAX_LIMIT = int(os.environ.get("LOADSHED_MAX_LIMIT", 500))
+LOADSHED_TARGET_SECONDS = float(os.environ.get("LOADSHED_TARGET_SECONDS", 1.0))
+LOADSHED_BACKOFF = float(os.environ.get("LOADSHED_BACKOFF", 0.9))
+
+# Route priorities and the share of the concurrency limit each may use
+CRITICAL, NORMAL, LOW = "critical", "normal", "low"
+PRIORITY_SHARE = {CRITICAL: 1.0, NORMAL: 0.75, LOW: 0.5}
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The current request ran out of time"""
+
+
+def remaining_time():
+    """Seconds left before the current request's deadline, or None outside a request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def deadline_passed() -> bool:
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def check_deadline():
+    if deadline_passed():
+        raise DeadlineExceeded()
+
+
+def request_timeout(default: float) -> float:
+    """Timeout for an outgoing call: `default`, capped by the time left"""
+    check_deadline()
+    remaining = remaining_time()
+    return default if remaining is None else min(default, remaining)
+
+
+def deadline_headers() -> dict:
+    """Headers forwarding the current deadline to another service"""
+    deadline = _deadline.get()
+    return {} if deadline is None else {DEADLINE_HEADER: str(int(deadline * 1000))}
+
+
+def _json_response(status, detail, extra_headers=()):
+    body = ('{"detail":"%s"}' % detail).encode()
+    start = {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *extra_headers,
+        ],
+    }
+    return start, {"type": "http.response.body", "body": body}
+
+
+class DeadlineMiddleware:
+    """ASGI middleware setting the request deadline and answering overruns with 504"""
+
+    def __init__(self, app, timeout=REQUEST_TIMEOUT_SECONDS):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        deadline = time.time() + self.timeout
+        for name, value in scope["headers"]:
+            if name == b"x-request-deadline":
+                try:
+                    deadline = min(deadline, int(value) / 1000)
+                except ValueError:
+                    pass
+                break
+
+        started = False
+
+        async def send_tracking(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        token = _deadline.set(deadline)
+        try:
+            check_deadline()
+            await self.app(scope, receive, send_tracking)
+        except Exception as e:
+            # Anything failing after the deadline (timeouts, cancelled queries) is reported as such
+            if started or not (isinstance(e, DeadlineExceeded) or deadline_passed()):
+                raise
+            for message in _json_response(504, "Request deadline exceeded"):
+                await send(message)
+        finally:
+            _deadline.reset(token)
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit for one worker's event loop"""
+
+    def __init__(self, initial=LOADSHED_INITIAL_LIMIT, minimum=LOADSHED_MIN_LIMIT, maximum=LOADSHED_MAX_LIMIT,
+                 target=LOADSHED_TARGET_SECONDS, backoff=LOADSHED_BACKOFF):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.backoff = backoff
+        self.inflight = 0
+        self._last_decrease = 0.0
+
+    def try_acquire(self, priority: str) -> bool:
+        if self.inflight >= max(1, math.floor(self.limit * PRIORITY_SHARE[priority])):
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self, latency: float, overloaded: bool):
+        self.inflight -= 1
+        now = time.monotonic()
+        if overloaded or latency > self.target:
+            # Back off at most once per target interval, so one burst of slow
+            # responses from the same overload does not collapse the limit
+            if now - self._last_decrease >= self.target:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._last_decrease = now
+        elif self.inflight + 1 >= self.limit / 2:
+            # Only grow while the limit is actually being used
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class AdaptiveConcurrencyMiddleware:
+    """ASGI middleware shedding requests beyond the adaptive limit with 503.
+
+    `priorities` is a list of (method, path prefix, priority), first match
+    wins; method "*" matches any. Unmatched routes are NORMAL and `exempt`
+    paths (health checks) are never shed.
+    """
+
+    def __init__(self, app, priorities=(), exempt=("/health",), limiter=None):
+        self.app = app
+        self.priorities = list(priorities)
+        self.exempt = set(exempt)
+        self.limiter = limiter or AdaptiveLimit()
+
+    def priority(self, method: str, path: str) -> str:
+        for rule_method, prefix, priority in self.priorities:
+            if rule_method in ("*", method) and path.startswith(prefix):
+                return priority
+        return NORMAL
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not LOADSHED_ENABLED or scope["path"] in self.exempt \
+                or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        if not self.limiter.try_acquire(self.priority(scope["method"], scope["path"])):
+            for message in _json_response(503, "Service overloaded", [(b"retry-after", b"1")]):
+                await send(message)
+            return
+
+        start = time.monotonic()
+        latency = None
+        overloaded = False
+
+        async def send_timed(message):
+            nonlocal latency, overloaded
+            if message["type"] == "http.response.start" and latency is None:
+                # Time to first byte, so long NDJSON streams do not count as slow
+                latency = time.monotonic() - start
+                overloaded = message["status"] in (503, 504)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        except Exception as e:
+            overloaded = isinstance(e, DeadlineExceeded) or deadline_passed()
+            raise
+        finally:
+            self.limiter.release(latency if latency is not None else time.monotonic() - start, overloaded)
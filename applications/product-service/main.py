@@ -1,15 +1,81 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import json
 import uvicorn
+import httpx
 import os
 
-from database import init_db, get_db, Product as ProductModel
+from database import (
+    init_db, get_db, get_read_db, dispose_engines, ConnectionLimitMiddleware,
+    Product as ProductModel, SalesRanking,
+)
+from compression import CompressionMiddleware
+from ratelimit import Budget, RateLimitMiddleware, create_backend
+from loadshed import CRITICAL, NORMAL, LOW, AdaptiveConcurrencyMiddleware, DeadlineMiddleware
+from ranking import RANKING_PERIODS, DEFAULT_PERIOD, RANKING_REFRESH_SECONDS, run_ranking_refresher
+from streaming import wants_stream, stream_query
 from sqlalchemy.orm import Session
 
-app = FastAPI(title="Product Service", version="3.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker resources: DB connections, HTTP client and the ranking refresher"""
+    # Workers forked from a preloading master must not reuse its pooled connections
+    dispose_engines(close=False)
+    if not os.environ.get("DB_PREPARED"):
+        prepare_database()
+
+    ranking_client = httpx.AsyncClient(timeout=10.0)
+    ranking_task = None
+    if RANKING_REFRESH_SECONDS > 0:
+        ranking_task = asyncio.create_task(run_ranking_refresher(ranking_client))
+
+    yield
+
+    if ranking_task:
+        ranking_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await ranking_task
+    await ranking_client.aclose()
+    await rate_limit_backend.close()
+    dispose_engines()
+
+
+app = FastAPI(title="Product Service", version="3.0.0", lifespan=lifespan)
+
+# Bound in-flight requests by the DB pool (added first so it is innermost and
+# requests rejected by outer middleware never queue for a slot)
+app.add_middleware(ConnectionLimitMiddleware)
+
+# Token buckets for the rate limiter; a Redis backend's connections are closed in lifespan
+rate_limit_backend = create_backend()
+
+# Rate limits per client IP (added before CORS so 429 responses still carry CORS headers)
+app.add_middleware(
+    RateLimitMiddleware,
+    rules={("GET", "/api/products"): Budget(capacity=120, per_seconds=60)},
+    backend=rate_limit_backend,
+)
+
+# Shed excess requests with 503 before they queue, lowest priority routes first
+app.add_middleware(
+    AdaptiveConcurrencyMiddleware,
+    priorities=[
+        ("GET", "/api/products/versions", CRITICAL),
+        ("GET", "/api/products/current", CRITICAL),
+        ("GET", "/api/products/featured", LOW),
+        ("GET", "/api/products/", NORMAL),
+        ("GET", "/api/products", LOW),
+        ("GET", "/api/brands", LOW),
+    ],
+)
+
+# Per-request deadline (X-Request-Deadline); outermost before CORS so overruns become 504s
+app.add_middleware(DeadlineMiddleware)
 
 # CORS configuration
 CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "http://localhost:8080,http://localhost:3000").split(",")
@@ -20,6 +86,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress catalog payloads; listing and featured responses are cached pre-compressed
+app.add_middleware(CompressionMiddleware, cacheable_paths=["/api/products", "/api/brands"])
 
 
 class Product(BaseModel):
@@ -43,6 +111,7 @@ class Product(BaseModel):
     is_new: bool
     is_bestseller: bool
     gender: str
+    version: int
 
 
 # Seed data for initial products
@@ -128,8 +197,8 @@ SEED_PRODUCTS = [
 ]
 
 
-@app.on_event("startup")
-def on_startup():
+def prepare_database():
+    """Create tables and seed products; runs once per deployment, before workers fork"""
     init_db()
     # Seed products if table is empty
     db = next(get_db())
@@ -163,15 +232,19 @@ async def health_check():
 
 @app.get("/api/products", response_model=List[Product])
 async def get_products(
+    request: Request,
     category: Optional[str] = None,
     gender: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     in_stock: Optional[bool] = None,
     sort_by: Optional[str] = Query(None, regex="^(price_asc|price_desc|rating|new)$"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    """Get products with advanced filtering and sorting"""
+    """Get products with advanced filtering and sorting.
+
+    Send `Accept: application/x-ndjson` to stream one product per line.
+    """
     query = db.query(ProductModel)
 
     if category:
@@ -194,26 +267,78 @@ async def get_products(
     elif sort_by == "new":
         query = query.order_by(ProductModel.is_new.desc())
 
+    if wants_stream(request):
+        return stream_query(query, ProductModel.to_dict)
+
     products = query.all()
     return [p.to_dict() for p in products]
 
 
 @app.get("/api/products/featured/bestsellers", response_model=List[Product])
-async def get_bestsellers(limit: int = 4, db: Session = Depends(get_db)):
-    """Get bestselling products"""
-    products = db.query(ProductModel).filter(ProductModel.is_bestseller == True).limit(limit).all()
+async def get_bestsellers(
+    limit: int = 4,
+    period: str = Query(DEFAULT_PERIOD, regex="^(" + "|".join(RANKING_PERIODS) + ")$"),
+    db: Session = Depends(get_read_db),
+):
+    """Get bestselling products ranked by units sold over the period"""
+    products = (
+        db.query(ProductModel)
+        .join(SalesRanking, SalesRanking.product_id == ProductModel.id)
+        .filter(SalesRanking.period == period)
+        .order_by(SalesRanking.units_sold.desc(), SalesRanking.revenue.desc())
+        .limit(limit)
+        .all()
+    )
+    if not products:
+        # No sales recorded yet - fall back to the curated flag
+        products = db.query(ProductModel).filter(ProductModel.is_bestseller == True).limit(limit).all()
     return [p.to_dict() for p in products]
 
 
 @app.get("/api/products/featured/new", response_model=List[Product])
-async def get_new_arrivals(limit: int = 4, db: Session = Depends(get_db)):
-    """Get new arrival products"""
-    products = db.query(ProductModel).filter(ProductModel.is_new == True).limit(limit).all()
+async def get_new_arrivals(limit: int = Query(4, ge=1, le=50), db: Session = Depends(get_read_db)):
+    """Get the most recently added products, newest first"""
+    products = (
+        db.query(ProductModel)
+        .order_by(ProductModel.created_at.desc(), ProductModel.id.desc())
+        .limit(limit)
+        .all()
+    )
     return [p.to_dict() for p in products]
 
 
+@app.get("/api/products/versions")
+async def get_product_versions(
+    ids: List[int] = Query([], max_length=100),
+    db: Session = Depends(get_db),
+):
+    """Current version of each requested product; unknown ids are omitted.
+
+    Lets order-service confirm a cart pricing snapshot without fetching the
+    products. Reads the primary: a lagging replica would confirm outdated prices.
+    """
+    if not ids:
+        return {"versions": {}}
+    rows = db.query(ProductModel.id, ProductModel.version).filter(ProductModel.id.in_(ids)).all()
+    return {"versions": {str(product_id): version for product_id, version in rows}}
+
+
+@app.get("/api/products/current", response_model=List[Product])
+async def get_current_products(
+    ids: List[int] = Query([], max_length=100),
+    db: Session = Depends(get_db),
+):
+    """Requested products read from the primary; unknown ids are omitted.
+
+    Used by order-service at checkout for lines whose price must be current.
+    """
+    if not ids:
+        return []
+    return [p.to_dict() for p in db.query(ProductModel).filter(ProductModel.id.in_(ids)).all()]
+
+
 @app.get("/api/products/{product_id}", response_model=Product)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, db: Session = Depends(get_read_db)):
     """Get single product details"""
     product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
     if not product:
@@ -222,14 +347,14 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
 
 
 @app.get("/api/brands")
-async def get_brands(db: Session = Depends(get_db)):
+async def get_brands(db: Session = Depends(get_read_db)):
     """Get all unique brands"""
     brands = [row[0] for row in db.query(ProductModel.brand).distinct().all()]
     return {"brands": sorted(brands)}
 
 
 @app.get("/")
-async def root(db: Session = Depends(get_db)):
+async def root(db: Session = Depends(get_read_db)):
     count = db.query(ProductModel).count()
     return {
         "service": "Product Service",
@@ -241,5 +366,16 @@ async def root(db: Session = Depends(get_db)):
 
 
 if __name__ == "__main__":
+    # Production runs under gunicorn (see gunicorn_conf.py); this is the dev server
     port = int(os.environ.get("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 8))
+    if workers > 1:
+        prepare_database()
+        dispose_engines()
+        os.environ["DB_PREPARED"] = "1"
+    uvicorn.run(
+        "main:app" if workers > 1 else app,
+        host="0.0.0.0", port=port, workers=workers,
+        timeout_graceful_shutdown=graceful_timeout,
+    )
@@ -0,0 +1,189 @@
+"""
+Materialized bestseller rankings driven by order-service sales data.
+
+Sales events (order items, and negative corrections for orders cancelled
+later) are pulled in batches from order-service's sales feed and folded
+into hourly per-product buckets. Each rolling period (24h/7d/30d) keeps a
+running total in `product_sales_rankings`:
+
+- new items are added to every period whose window covers their bucket
+- buckets that slide out of a window are subtracted from that period
+
+so a refresh only touches the new items and the expired hours, never the
+full sales history. The featured endpoints then read the top N rows of a
+period straight from the (period, units_sold) index.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from database import (
+    SessionLocal, upsert_increment,
+    SalesBucket, SalesRanking, RankingPeriod, SalesFeedCursor,
+)
+
+ORDER_SERVICE_URL = os.environ.get("ORDER_SERVICE_URL", "http://localhost:8002")
+RANKING_REFRESH_SECONDS = float(os.environ.get("RANKING_REFRESH_SECONDS", 60))
+RANKING_FEED_BATCH = int(os.environ.get("RANKING_FEED_BATCH", 500))
+# Presented to order-service as X-Service-Key to read the sales feed
+SERVICE_API_KEY = os.environ.get("SERVICE_API_KEY", "change-this-service-key")
+
+RANKING_PERIODS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+DEFAULT_PERIOD = "7d"
+
+
+class StaleRefresh(Exception):
+    """Another worker advanced the cursor or a period first"""
+
+
+def bucket_start(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def period_cutoffs(now: datetime) -> dict:
+    """Oldest bucket still inside each period's window"""
+    current = bucket_start(now)
+    return {period: current - span for period, span in RANKING_PERIODS.items()}
+
+
+def _expire_periods(db, cutoffs):
+    """Subtract buckets that slid out of each window since the last refresh.
+
+    Returns each period's expiry watermark: `cutoff`, or a later one another
+    worker already expired up to. Buckets before it are no longer counted.
+    """
+    watermarks = {}
+    for period, cutoff in cutoffs.items():
+        state = db.get(RankingPeriod, period)
+        watermarks[period] = cutoff if state is None else max(cutoff, state.expired_before)
+        if state is None:
+            # New period: seed it once from whatever buckets are already in range
+            db.add(RankingPeriod(period=period, expired_before=cutoff))
+            rows = db.query(
+                SalesBucket.product_id, func.sum(SalesBucket.units_sold), func.sum(SalesBucket.revenue),
+            ).filter(SalesBucket.bucket_start >= cutoff).group_by(SalesBucket.product_id).all()
+            for product_id, units, revenue in rows:
+                upsert_increment(db, SalesRanking, {"period": period, "product_id": product_id},
+                                 {"units_sold": units, "revenue": revenue})
+            continue
+
+        previous = state.expired_before
+        if previous >= cutoff:
+            continue
+
+        rows = db.query(
+            SalesBucket.product_id, func.sum(SalesBucket.units_sold), func.sum(SalesBucket.revenue),
+        ).filter(
+            SalesBucket.bucket_start >= previous,
+            SalesBucket.bucket_start < cutoff,
+        ).group_by(SalesBucket.product_id).all()
+        for product_id, units, revenue in rows:
+            upsert_increment(db, SalesRanking, {"period": period, "product_id": product_id},
+                             {"units_sold": -units, "revenue": -revenue})
+
+        advanced = db.execute(
+            update(RankingPeriod)
+            .where(RankingPeriod.period == period, RankingPeriod.expired_before == previous)
+            .values(expired_before=cutoff)
+        )
+        if advanced.rowcount != 1:
+            raise StaleRefresh(period)
+
+    db.query(SalesRanking).filter(SalesRanking.units_sold <= 0).delete()
+    oldest = min(cutoffs.values())
+    db.query(SalesBucket).filter(SalesBucket.bucket_start < oldest).delete()
+    return watermarks
+
+
+def _apply_items(db, items, watermarks):
+    """Fold a page of feed items into the hourly buckets and the totals of periods still covering them"""
+    for item in items:
+        bucket = bucket_start(datetime.fromisoformat(item["created_at"]))
+        increments = {"units_sold": item["quantity"], "revenue": item["subtotal"]}
+        upsert_increment(db, SalesBucket, {"product_id": item["product_id"], "bucket_start": bucket}, increments)
+        for period, watermark in watermarks.items():
+            if bucket >= watermark:
+                upsert_increment(db, SalesRanking, {"period": period, "product_id": item["product_id"]}, increments)
+
+
+def apply_feed_page(items, last_item_id, now=None):
+    """Expire old buckets and apply one page of feed items in a single transaction.
+
+    The cursor and period watermarks are advanced with compare-and-set updates,
+    so concurrent workers never fold the same items or hours in twice.
+    Returns False when another worker got there first.
+    """
+    cutoffs = period_cutoffs(now or datetime.utcnow())
+    db = SessionLocal()
+    try:
+        cursor = db.get(SalesFeedCursor, 1)
+        if cursor is None:
+            db.add(SalesFeedCursor(id=1, last_item_id=0))
+            db.flush()
+            previous_id = 0
+        else:
+            previous_id = cursor.last_item_id
+
+        watermarks = _expire_periods(db, cutoffs)
+        if last_item_id > previous_id:
+            if items and items[0]["id"] <= previous_id:
+                raise StaleRefresh("feed")
+            _apply_items(db, items, watermarks)
+            advanced = db.execute(
+                update(SalesFeedCursor)
+                .where(SalesFeedCursor.id == 1, SalesFeedCursor.last_item_id == previous_id)
+                .values(last_item_id=last_item_id)
+            )
+            if advanced.rowcount != 1:
+                raise StaleRefresh("feed")
+        db.commit()
+        return True
+    except (StaleRefresh, IntegrityError):
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def feed_cursor() -> int:
+    db = SessionLocal()
+    try:
+        cursor = db.get(SalesFeedCursor, 1)
+        return cursor.last_item_id if cursor else 0
+    finally:
+        db.close()
+
+
+async def refresh_rankings(client: httpx.AsyncClient):
+    """Pull new sales events from order-service until the feed is drained"""
+    while True:
+        after_id = await asyncio.to_thread(feed_cursor)
+        response = await client.get(
+            f"{ORDER_SERVICE_URL}/api/orders/items/feed",
+            params={"after_id": after_id, "limit": RANKING_FEED_BATCH},
+            headers={"X-Service-Key": SERVICE_API_KEY},
+        )
+        response.raise_for_status()
+        page = response.json()
+        applied = await asyncio.to_thread(apply_feed_page, page["items"], page["last_id"])
+        if not applied or not page["has_more"]:
+            return
+
+
+async def run_ranking_refresher(client: httpx.AsyncClient):
+    """Background loop refreshing rankings every RANKING_REFRESH_SECONDS"""
+    while True:
+        try:
+            await refresh_rankings(client)
+        except Exception as e:
+            print(f"Error refreshing sales rankings: {e}")
+        await asyncio.sleep(RANKING_REFRESH_SECONDS)
@@ -1,15 +1,105 @@
+import asyncio
+import itertools
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, func
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+from sqlalchemy import create_engine, event, text, Column, Integer, String, Boolean, DateTime, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+from loadshed import DeadlineExceeded, check_deadline, deadline_passed, remaining_time
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./users.db")
 
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+# Optional comma-separated read replicas; reads fall back to the primary when unset
+DATABASE_REPLICA_URLS = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_CHECK_SECONDS = float(os.environ.get("REPLICA_CHECK_SECONDS", 5))
+REPLICA_RETRY_SECONDS = float(os.environ.get("REPLICA_RETRY_SECONDS", 30))
+
+# Connection pool per engine, per worker process: size the total
+# (workers x capacity) to fit the database's connection limit
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_CAPACITY = DB_POOL_SIZE + DB_MAX_OVERFLOW
+# Postgres connect timeout (whole seconds), so an unreachable host fails fast
+DB_CONNECT_TIMEOUT_SECONDS = int(os.environ.get("DB_CONNECT_TIMEOUT_SECONDS", 3))
+
+
+def make_engine(url):
+    pool_args = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+    # Handle sqlite vs postgres
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False}, **pool_args)
+    return create_engine(
+        url, pool_pre_ping=True, connect_args={"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS}, **pool_args,
+    )
+
+
+engine = make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class ReplicaPool:
+    """Round-robin over read replicas, skipping ones that fail a health probe.
+
+    A replica is probed with SELECT 1 before first use and again once its
+    last successful check is older than `check_seconds`. Failed replicas are
+    skipped for `retry_seconds` before being probed again. Only one request
+    probes a given replica at a time; the others skip it meanwhile.
+    """
+
+    def __init__(self, engines, primary, check_seconds=REPLICA_CHECK_SECONDS, retry_seconds=REPLICA_RETRY_SECONDS):
+        self.engines = engines
+        self.primary = primary
+        self.check_seconds = check_seconds
+        self.retry_seconds = retry_seconds
+        self._healthy_until = {}
+        self._down_until = {}
+        self._probing = set()
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def pick(self):
+        """Return a healthy replica engine, or the primary if none are available"""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            with self._lock:
+                candidate = self.engines[next(self._next) % len(self.engines)]
+                healthy_until = self._healthy_until.get(candidate, 0)
+                probe = healthy_until <= now and self._down_until.get(candidate, 0) <= now \
+                    and candidate not in self._probing
+                if probe:
+                    self._probing.add(candidate)
+            if healthy_until > now:
+                return candidate
+            if probe and self._probe(candidate):
+                return candidate
+        return self.primary
+
+    def mark_down(self, replica):
+        if replica is not self.primary:
+            with self._lock:
+                self._healthy_until.pop(replica, None)
+                self._down_until[replica] = time.monotonic() + self.retry_seconds
+
+    def _probe(self, replica):
+        try:
+            with replica.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except OperationalError:
+            self.mark_down(replica)
+            return False
+        else:
+            with self._lock:
+                self._healthy_until[replica] = time.monotonic() + self.check_seconds
+            return True
+        finally:
+            with self._lock:
+                self._probing.discard(replica)
+
+
+replica_pool = ReplicaPool([make_engine(url) for url in DATABASE_REPLICA_URLS], engine)
 Base = declarative_base()
 
 
@@ -37,9 +127,82 @@ def init_db():
     Base.metadata.create_all(bind=engine)
 
 
+def dispose_engines(close=True):
+    """Drop pooled connections for the primary and every replica.
+
+    Call with close=False in a freshly forked worker so it opens its own
+    connections instead of sharing sockets inherited from the parent.
+    """
+    engine.dispose(close=close)
+    for replica in replica_pool.engines:
+        replica.dispose(close=close)
+
+
+class ConnectionLimitMiddleware:
+    """ASGI middleware queueing requests beyond the connection pool's capacity.
+
+    Endpoints run their queries on the event loop and sessions are only closed
+    after the response is sent, so a request that finds the pool exhausted
+    would block the loop - and with it every session close - until
+    pool_timeout. Waiting here instead is non-blocking, and each request that
+    gets through is guaranteed a free connection. `exempt` paths (health
+    checks) do not use the database and never wait.
+    """
+
+    def __init__(self, app, limit=DB_POOL_CAPACITY, exempt=("/health",)):
+        self.app = app
+        self.limit = limit
+        self.exempt = set(exempt)
+        self._semaphore = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        if self._semaphore is None:
+            # Created lazily so it binds to the worker's running event loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        # Give up waiting once the request's deadline has passed
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), remaining_time())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._semaphore.release()
+
+
+@event.listens_for(Session, "after_begin")
+def apply_request_deadline(session, transaction, connection):
+    """Refuse to start a transaction past the request deadline; cap Postgres statements to the time left"""
+    check_deadline()
+    remaining = remaining_time()
+    if remaining is not None and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(remaining * 1000))}")
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Session for read-only endpoints, routed to a replica when one is configured.
+
+    Read-your-writes paths must keep using get_db so they stay on the primary.
+    """
+    replica = replica_pool.pick()
+    db = SessionLocal(bind=replica)
+    try:
+        yield db
+    except OperationalError:
+        # A statement cancelled by the request deadline says nothing about the replica
+        if not deadline_passed():
+            replica_pool.mark_down(replica)
+        raise
+    finally:
+        db.close()
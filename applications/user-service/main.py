@@ -1,18 +1,69 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 from typing import List
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import uvicorn
 import os
 import jwt
 import bcrypt
 
-from database import init_db, get_db, User as UserModel
+from database import init_db, get_db, get_read_db, dispose_engines, ConnectionLimitMiddleware, User as UserModel
 from sqlalchemy.orm import Session
+from streaming import wants_stream, stream_query
+from ratelimit import Budget, RateLimitMiddleware, create_backend, jwt_subject
+from loadshed import LOW, AdaptiveConcurrencyMiddleware, DeadlineMiddleware
 
-app = FastAPI(title="User Service", version="2.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker resources: DB connections"""
+    # Workers forked from a preloading master must not reuse its pooled connections
+    dispose_engines(close=False)
+    if not os.environ.get("DB_PREPARED"):
+        prepare_database()
+
+    yield
+
+    await rate_limit_backend.close()
+    dispose_engines()
+
+
+app = FastAPI(title="User Service", version="2.0.0", lifespan=lifespan)
+
+SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-secret-key")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 60
+
+# Bound in-flight requests by the DB pool (added first so it is innermost and
+# requests rejected by outer middleware never queue for a slot)
+app.add_middleware(ConnectionLimitMiddleware)
+
+# Token buckets for the rate limiter; a Redis backend's connections are closed in lifespan
+rate_limit_backend = create_backend()
+
+# Rate limits (added before CORS so 429 responses still carry CORS headers)
+app.add_middleware(
+    RateLimitMiddleware,
+    rules={
+        ("POST", "/api/auth/login"): Budget(capacity=10, per_seconds=60),
+        ("POST", "/api/auth/register"): Budget(capacity=5, per_seconds=60),
+        ("GET", "/api/users"): Budget(capacity=20, per_seconds=60),
+    },
+    identify=jwt_subject(SECRET_KEY, ALGORITHM),
+    backend=rate_limit_backend,
+)
+
+# Shed excess requests with 503 before they queue, lowest priority routes first
+app.add_middleware(
+    AdaptiveConcurrencyMiddleware,
+    priorities=[("*", "/api/users", LOW)],
+)
+
+# Per-request deadline (X-Request-Deadline); outermost before CORS so overruns become 504s
+app.add_middleware(DeadlineMiddleware)
 
 # CORS configuration
 CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "http://localhost:8080,http://localhost:3000").split(",")
@@ -24,10 +75,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-secret-key")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
-
 security = HTTPBearer()
 
 
@@ -89,8 +136,8 @@ async def get_current_user(
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-@app.on_event("startup")
-def on_startup():
+def prepare_database():
+    """Create tables; runs once per deployment, before workers fork"""
     init_db()
 
 
@@ -129,8 +176,12 @@ async def get_me(current_user: UserModel = Depends(get_current_user)):
     return current_user.to_dict()
 
 @app.get("/api/users")
-async def list_users(db: Session = Depends(get_db)):
-    users = db.query(UserModel).all()
+async def list_users(request: Request, db: Session = Depends(get_read_db)):
+    query = db.query(UserModel)
+    if wants_stream(request):
+        return stream_query(query, UserModel.to_dict)
+
+    users = query.all()
     return [u.to_dict() for u in users]
 
 @app.get("/")
@@ -143,5 +194,16 @@ async def root():
     }
 
 if __name__ == "__main__":
+    # Production runs under gunicorn (see gunicorn_conf.py); this is the dev server
     port = int(os.environ.get("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 8))
+    if workers > 1:
+        prepare_database()
+        dispose_engines()
+        os.environ["DB_PREPARED"] = "1"
+    uvicorn.run(
+        "main:app" if workers > 1 else app,
+        host="0.0.0.0", port=port, workers=workers,
+        timeout_graceful_shutdown=graceful_timeout,
+    )
@@ -0,0 +1,36 @@
+"""
+Streaming JSON responses for large list endpoints.
+
+Clients that send `Accept: application/x-ndjson` get one JSON object per line,
+serialized with orjson straight from a server-side cursor instead of building
+and validating the full result list in memory.
+"""
+
+import os
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", 500))
+
+
+def wants_stream(request: Request) -> bool:
+    """True when the client asked for newline-delimited JSON"""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def stream_query(query, serialize, batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse:
+    """Stream ORM rows as NDJSON, fetching `batch_size` rows per round trip"""
+    return stream_queries([(query, serialize)], batch_size)
+
+
+def stream_queries(parts, batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse:
+    """Stream several (query, serialize) pairs one after another as a single NDJSON body"""
+    def generate():
+        for query, serialize in parts:
+            for row in query.yield_per(batch_size):
+                yield orjson.dumps(serialize(row)) + b"\n"
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
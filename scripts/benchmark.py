@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+Perfume Store Platform - Benchmarks
+
+Runs services in-process against throwaway SQLite databases and reports
+per-request cost. Usage:
+
+    python scripts/benchmark.py compression [--products 500] [--requests 200]
+    python scripts/benchmark.py ratelimit [--requests 20000] [--redis-url URL]
+    python scripts/benchmark.py workers [--max-workers N] [--duration 10]
+    python scripts/benchmark.py storefront [--pages 200] [--rtt-ms 50]
+    python scripts/benchmark.py overload [--duration 10] [--low-concurrency 96]
+
+The workers, storefront and overload benchmarks start real gunicorn servers on localhost instead.
+"""
+
+import argparse
+import asyncio
+import importlib
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_MODULES = ["main", "database", "streaming", "ranking", "compression", "ratelimit", "rollups", "archive", "loadshed"]
+
+
+def load_service(name, env=None):
+    """Import a service's main module fresh, with its own SQLite file in a temp dir"""
+    os.chdir(tempfile.mkdtemp(prefix=f"bench-{name}-"))
+    os.environ.update(env or {})
+    for module in SERVICE_MODULES:
+        sys.modules.pop(module, None)
+    service_dir = os.path.join(ROOT_DIR, "applications", name)
+    sys.path.insert(0, service_dir)
+    try:
+        return importlib.import_module("main")
+    finally:
+        sys.path.remove(service_dir)
+
+
+def spawn_service(name, port, env=None, workers=1):
+    """Start a service under gunicorn on localhost and wait until /health answers"""
+    service_env = {**os.environ, "PORT": str(port), "WEB_CONCURRENCY": str(workers), **(env or {})}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "main:app"],
+        cwd=os.path.join(ROOT_DIR, "applications", name),
+        env=service_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{name} did not start on port {port}")
+
+
+def stop_service(process):
+    process.terminate()
+    process.wait(timeout=30)
+
+
+def _load_client(url, duration, concurrency, headers):
+    """One load-generating process: `concurrency` requests in flight for `duration` seconds"""
+    import httpx
+
+    async def run():
+        latencies = []
+        ok_latencies = []
+        statuses = {}
+        stop_at = time.monotonic() + duration
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=30.0, headers=headers) as client:
+            async def loop():
+                while time.monotonic() < stop_at:
+                    start = time.perf_counter()
+                    try:
+                        status = (await client.get(url)).status_code
+                    except httpx.HTTPError:
+                        status = "error"
+                    latency = time.perf_counter() - start
+                    latencies.append(latency)
+                    if status == 200:
+                        ok_latencies.append(latency)
+                    statuses[status] = statuses.get(status, 0) + 1
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+        return latencies, statuses, ok_latencies
+
+    return asyncio.run(run())
+
+
+def run_load(url, duration, clients=2, concurrency=16, headers=None):
+    """Drive `url` from several client processes; returns (latencies, status counts)"""
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.starmap(_load_client, [(url, duration, concurrency, headers or {})] * clients)
+    latencies, statuses = [], {}
+    for client_latencies, client_statuses, _ in results:
+        latencies += client_latencies
+        for status, count in client_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return sorted(latencies), statuses
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
+
+
+# =============================================================================
+# Compression: bytes on the wire and CPU per request for /api/products
+# =============================================================================
+
+def bench_compression(args):
+    main = load_service("product-service", {
+        "RANKING_REFRESH_SECONDS": "0", "RATE_LIMIT_ENABLED": "false", "LOADSHED_ENABLED": "false",
+    })
+    from fastapi.testclient import TestClient
+    from database import SessionLocal, Product
+    import compression
+
+    with TestClient(main.app) as client:
+        # Grow the seeded catalog to a realistic size by cloning rows
+        db = SessionLocal()
+        seed = db.query(Product).all()
+        columns = [c.name for c in Product.__table__.columns if c.name not in ("id", "created_at", "updated_at")]
+        for i in range(max(args.products - len(seed), 0)):
+            source = seed[i % len(seed)]
+            clone = Product(**{c: getattr(source, c) for c in columns})
+            clone.name = f"{source.name} #{i}"
+            db.add(clone)
+        db.commit()
+        db.close()
+
+        body = client.get("/api/products", headers={"Accept-Encoding": "identity"}).content
+        encodings = ["identity"] + [e for e in compression.PREFERENCE if e in compression.COMPRESSORS]
+        rows = []
+        for encoding in encodings:
+            for cached in ([False, True] if encoding != "identity" else [False]):
+                middleware = _set_cacheable(main.app, cached)
+                wire_bytes = _fetch_raw(client, encoding)
+
+                start = time.process_time()
+                for _ in range(args.requests):
+                    _fetch_raw(client, encoding)
+                request_ms = (time.process_time() - start) * 1000 / args.requests
+
+                compress_ms = 0.0
+                if encoding != "identity":
+                    start = time.process_time()
+                    for _ in range(args.requests):
+                        middleware._compress(body, encoding, cached)
+                    compress_ms = (time.process_time() - start) * 1000 / args.requests
+
+                rows.append([
+                    encoding, "yes" if cached else "no", wire_bytes,
+                    f"{wire_bytes / len(body):.1%}", f"{compress_ms:.3f}", f"{request_ms:.2f}",
+                ])
+
+    print(f"\nGET /api/products with {args.products} products, {args.requests} requests each\n")
+    print_table(["encoding", "cached", "bytes", "ratio", "compress cpu ms", "request cpu ms"], rows)
+
+
+def _find_middleware(app, cls):
+    layer = app.middleware_stack
+    while layer is not None:
+        if isinstance(layer, cls):
+            return layer
+        layer = getattr(layer, "app", None)
+    return None
+
+
+def _set_cacheable(app, cached):
+    """Toggle the pre-compressed cache on the live middleware instance"""
+    import compression
+    middleware = _find_middleware(app, compression.CompressionMiddleware)
+    middleware.cacheable_paths = ("/api/products",) if cached else ()
+    middleware.cache = compression.CompressedCache()
+    return middleware
+
+
+def _fetch_raw(client, encoding):
+    with client.stream("GET", "/api/products", headers={"Accept-Encoding": encoding}) as response:
+        return len(b"".join(response.iter_raw()))
+
+
+# =============================================================================
+# Rate limiting: per-request overhead of the token-bucket middleware
+# =============================================================================
+
+def bench_ratelimit(args):
+    sys.path.insert(0, os.path.join(ROOT_DIR, "applications", "user-service"))
+    import jwt
+    import ratelimit
+
+    secret = "benchmark-secret"
+    token = jwt.encode({"sub": "bench@example.com"}, secret, algorithm="HS256")
+    budget = ratelimit.Budget(capacity=args.requests * 10, per_seconds=1)
+
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def run(app, headers):
+        scope = {"type": "http", "method": "POST", "path": "/api/auth/login",
+                 "headers": headers, "client": ("10.0.0.1", 1234)}
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            pass
+
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            await app(scope, receive, send)
+        return (time.perf_counter() - start) * 1e6 / args.requests
+
+    rules = {("POST", "/api/auth/login"): budget}
+    bearer = [(b"authorization", f"Bearer {token}".encode())]
+    variants = [
+        ("no limiter", endpoint, []),
+        ("memory, by IP", ratelimit.RateLimitMiddleware(endpoint, rules, ratelimit.MemoryBackend()), []),
+        ("memory, by JWT", ratelimit.RateLimitMiddleware(
+            endpoint, rules, ratelimit.MemoryBackend(), ratelimit.jwt_subject(secret, "HS256")), bearer),
+    ]
+    if args.redis_url:
+        variants.append(("redis, by IP", ratelimit.RateLimitMiddleware(
+            endpoint, rules, ratelimit.RedisBackend(args.redis_url, prefix="bench:")), []))
+
+    async def run_all():
+        results = []
+        for name, app, headers in variants:
+            results.append((name, await run(app, headers)))
+        return results
+
+    results = asyncio.run(run_all())
+    baseline = results[0][1]
+    print(f"\nRate limiter overhead, {args.requests} requests per variant\n")
+    print_table(
+        ["variant", "us/req", "overhead us"],
+        [[name, f"{us:.1f}", f"{us - baseline:.1f}"] for name, us in results],
+    )
+
+
+# =============================================================================
+# Workers: catalog throughput from 1 to N gunicorn workers
+# =============================================================================
+
+def bench_workers(args):
+    workdir = tempfile.mkdtemp(prefix="bench-workers-")
+    db_path = os.path.join(workdir, "products.db")
+    env = {
+        "DATABASE_URL": f"sqlite:///{db_path}", "RANKING_REFRESH_SECONDS": "0",
+        "RATE_LIMIT_ENABLED": "false", "LOADSHED_ENABLED": "false",
+    }
+
+    # First start seeds the database; then grow the catalog by doubling rows
+    stop_service(spawn_service("product-service", args.port, env))
+    conn = sqlite3.connect(db_path)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(products)") if row[1] != "id"]
+    column_list = ", ".join(columns)
+    while conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] < args.products:
+        conn.execute(f"INSERT INTO products ({column_list}) SELECT {column_list} FROM products")
+    conn.commit()
+    conn.close()
+
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    counts = sorted({1, *(w for w in (2, 4, 8, 16) if w <= args.max_workers), args.max_workers})
+    rows = []
+    baseline = None
+    for workers in counts:
+        process = spawn_service("product-service", args.port, env, workers=workers)
+        try:
+            latencies, statuses = run_load(url, args.duration, args.clients, args.concurrency)
+        finally:
+            stop_service(process)
+        rps = len(latencies) / args.duration
+        baseline = baseline or rps
+        rows.append([
+            workers, f"{rps:.0f}", f"{rps / baseline:.2f}x",
+            f"{percentile(latencies, 0.5) * 1000:.1f}", f"{percentile(latencies, 0.99) * 1000:.1f}",
+            statuses.get(200, 0), len(latencies) - statuses.get(200, 0),
+        ])
+
+    print(f"\nGET {args.path} ({args.products}+ products), {args.clients}x{args.concurrency} "
+          f"concurrent clients, {args.duration}s per run, {os.cpu_count()} CPUs\n")
+    print_table(["workers", "req/s", "scaling", "p50 ms", "p99 ms", "ok", "failed"], rows)
+
+
+# =============================================================================
+# Storefront: one aggregated request vs the per-section fetch waterfall
+# =============================================================================
+
+def bench_storefront(args):
+    import jwt
+
+    workdir = tempfile.mkdtemp(prefix="bench-storefront-")
+    secret = "benchmark-secret"
+    common = {"RATE_LIMIT_ENABLED": "false", "LOADSHED_ENABLED": "false", "JWT_SECRET_KEY": secret}
+    product_url = f"http://127.0.0.1:{args.port}"
+    order_url = f"http://127.0.0.1:{args.port + 1}"
+    product_service = spawn_service("product-service", args.port, {
+        **common, "DATABASE_URL": f"sqlite:///{workdir}/products.db", "RANKING_REFRESH_SECONDS": "0",
+    })
+    order_service = None
+    try:
+        order_service = spawn_service("order-service", args.port + 1, {
+            **common, "DATABASE_URL": f"sqlite:///{workdir}/orders.db",
+            "PRODUCT_SERVICE_URL": product_url, "ARCHIVE_INTERVAL_SECONDS": "0",
+        })
+        token = jwt.encode({"sub": "bench@example.com"}, secret, algorithm="HS256")
+        auth = {"Authorization": f"Bearer {token}"}
+        rows = asyncio.run(_storefront_pages(args, product_url, order_url, auth))
+    finally:
+        if order_service:
+            stop_service(order_service)
+        stop_service(product_service)
+
+    print(f"\nHome page load, {args.pages} loads per variant, {args.cart_items} cart items, "
+          f"{args.rtt_ms:.0f} ms simulated client round trip\n")
+    print_table(["variant", "requests", "kB", "p50 ms", "p99 ms"], rows)
+
+
+async def _storefront_pages(args, product_url, order_url, auth):
+    import httpx
+
+    rtt = args.rtt_ms / 1000
+
+    async def get(client, url, stats, headers=None):
+        await asyncio.sleep(rtt)
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        stats["requests"] += 1
+        stats["bytes"] += len(response.content)
+        return response.json()
+
+    async def waterfall(client, stats, signed_in):
+        # What the page did before the storefront endpoint: sections one after another,
+        # then the cart, then one product fetch per cart line
+        await get(client, f"{product_url}/api/products", stats)
+        await get(client, f"{product_url}/api/products/featured/new", stats)
+        await get(client, f"{product_url}/api/products/featured/bestsellers", stats)
+        if signed_in:
+            cart = await get(client, f"{order_url}/api/cart", stats, auth)
+            await asyncio.gather(*(
+                get(client, f"{product_url}/api/products/{item['product_id']}", stats) for item in cart["items"]
+            ))
+
+    async def storefront(client, stats, signed_in):
+        await get(client, f"{order_url}/api/storefront", stats, auth if signed_in else None)
+
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        products = (await client.get(f"{product_url}/api/products")).json()
+        for product in [p for p in products if p["in_stock"]][:args.cart_items]:
+            response = await client.post(f"{order_url}/api/cart/add", headers=auth,
+                                         json={"product_id": product["id"], "quantity": 1})
+            response.raise_for_status()
+
+        rows = []
+        for signed_in in (False, True):
+            for name, load_page in (("waterfall", waterfall), ("storefront", storefront)):
+                stats = {"requests": 0, "bytes": 0}
+                await load_page(client, stats, signed_in)  # warm caches and connections
+                stats = {"requests": 0, "bytes": 0}
+                latencies = []
+                for _ in range(args.pages):
+                    start = time.perf_counter()
+                    await load_page(client, stats, signed_in)
+                    latencies.append(time.perf_counter() - start)
+                latencies.sort()
+                rows.append([
+                    f"{name} ({'signed in' if signed_in else 'anonymous'})",
+                    stats["requests"] // args.pages, f"{stats['bytes'] / args.pages / 1024:.1f}",
+                    f"{percentile(latencies, 0.5) * 1000:.1f}", f"{percentile(latencies, 0.99) * 1000:.1f}",
+                ])
+        return rows
+
+
+# =============================================================================
+# Overload: low-priority catalog listing vs checkout
+# =============================================================================
+
+def _order_client(order_url, secret, product_id, route, duration, concurrency, deadline):
+    """One order-service client process: `concurrency` signed-in shoppers for `duration` seconds.
+
+    "cart" shoppers view a one-item cart; "checkout" shoppers add an item
+    (retried until it succeeds, not counted) and order it with the returned
+    pricing snapshot, only the order being timed and counted. Every request
+    carries an X-Request-Deadline `deadline` seconds out, as an edge proxy
+    would set it, for order-service to forward.
+    """
+    import httpx
+    import jwt
+
+    def with_deadline(headers):
+        return {**headers, "X-Request-Deadline": str(int((time.time() + deadline) * 1000))}
+
+    async def run():
+        latencies = []
+        ok_latencies = []
+        statuses = {}
+        stop_at = time.monotonic() + duration
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=order_url, limits=limits, timeout=30.0) as client:
+            async def shopper(index):
+                token = jwt.encode({"sub": f"bench-{os.getpid()}-{index}@example.com"}, secret, algorithm="HS256")
+                auth = {"Authorization": f"Bearer {token}"}
+                item = {"product_id": product_id, "quantity": 1}
+                if route == "cart":
+                    while time.monotonic() < stop_at and \
+                            (await client.post("/api/cart/add", headers=auth, json=item)).status_code != 200:
+                        await asyncio.sleep(0.1)
+                while time.monotonic() < stop_at:
+                    if route == "checkout":
+                        added = await client.post("/api/cart/add", headers=with_deadline(auth), json=item)
+                        if added.status_code != 200:
+                            await asyncio.sleep(0.1)
+                            continue
+                    start = time.perf_counter()
+                    try:
+                        if route == "cart":
+                            status = (await client.get("/api/cart", headers=with_deadline(auth))).status_code
+                        else:
+                            status = (await client.post("/api/orders", headers=with_deadline(auth), json={
+                                "pricing_snapshot": added.json()["cart"]["pricing_snapshot"],
+                            })).status_code
+                    except httpx.HTTPError:
+                        status = "error"
+                    latency = time.perf_counter() - start
+                    latencies.append(latency)
+                    if status in (200, 201):
+                        ok_latencies.append(latency)
+                    statuses[status] = statuses.get(status, 0) + 1
+            await asyncio.gather(*(shopper(index) for index in range(concurrency)))
+        return latencies, statuses, ok_latencies
+
+    return asyncio.run(run())
+
+
+def bench_overload(args):
+    workdir = tempfile.mkdtemp(prefix="bench-overload-")
+    db_path = os.path.join(workdir, "products.db")
+    secret = "benchmark-secret"
+    env = {
+        "RATE_LIMIT_ENABLED": "false", "LOADSHED_TARGET_SECONDS": str(args.target), "JWT_SECRET_KEY": secret,
+    }
+    product_env = {**env, "DATABASE_URL": f"sqlite:///{db_path}", "RANKING_REFRESH_SECONDS": "0"}
+    order_env = {
+        **env, "DATABASE_URL": f"sqlite:///{workdir}/orders.db", "ARCHIVE_INTERVAL_SECONDS": "0",
+        "PRODUCT_SERVICE_URL": f"http://127.0.0.1:{args.port}",
+    }
+
+    stop_service(spawn_service("product-service", args.port, product_env))
+    conn = sqlite3.connect(db_path)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(products)") if row[1] != "id"]
+    column_list = ", ".join(columns)
+    while conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] < args.products:
+        conn.execute(f"INSERT INTO products ({column_list}) SELECT {column_list} FROM products")
+    conn.commit()
+    product_id = conn.execute("SELECT id FROM products WHERE in_stock ORDER BY id LIMIT 1").fetchone()[0]
+    conn.close()
+
+    base = f"http://127.0.0.1:{args.port}"
+    order_url = f"http://127.0.0.1:{args.port + 1}"
+    flood = ("GET /api/products (low)", _load_client,
+             (f"{base}/api/products", args.duration, args.low_concurrency, {}))
+    runs = [
+        # Checkout's version check called directly
+        ("catalog", False, [flood, (
+            "GET /api/products/versions (critical)", _load_client,
+            (f"{base}/api/products/versions?ids=1&ids=2&ids=3", args.duration, args.critical_concurrency, {}),
+        )]),
+        # Shoppers going through order-service, whose product calls forward their deadline
+        ("orders", True, [flood, (
+            "GET /api/cart (normal)", _order_client,
+            (order_url, secret, product_id, "cart", args.duration, args.cart_concurrency, args.deadline),
+        ), (
+            "POST /api/orders (critical)", _order_client,
+            (order_url, secret, product_id, "checkout", args.duration, args.critical_concurrency, args.deadline),
+        )]),
+    ]
+    rows = []
+    for run, with_orders, routes in runs:
+        for shedding in (False, True):
+            shed_env = {"LOADSHED_ENABLED": str(shedding).lower()}
+            processes = [spawn_service("product-service", args.port, {**product_env, **shed_env})]
+            try:
+                if with_orders:
+                    processes.append(spawn_service("order-service", args.port + 1, {**order_env, **shed_env}))
+                with multiprocessing.Pool(len(routes)) as pool:
+                    pending = [pool.apply_async(client, client_args) for _, client, client_args in routes]
+                    results = [result.get() for result in pending]
+            finally:
+                for process in processes:
+                    stop_service(process)
+            for (name, _, _), (latencies, statuses, ok_latencies) in zip(routes, results):
+                ok_latencies.sort()
+                ok = statuses.get(200, 0) + statuses.get(201, 0)
+                shed, late = statuses.get(503, 0), statuses.get(504, 0)
+                rows.append([
+                    run, "on" if shedding else "off", name, f"{ok / args.duration:.0f}", shed, late,
+                    len(latencies) - ok - shed - late,
+                    f"{percentile(ok_latencies, 0.5) * 1000:.0f}", f"{percentile(ok_latencies, 0.99) * 1000:.0f}",
+                ])
+
+    print(f"\n{args.products}+ products, {args.low_concurrency} low-priority, {args.cart_concurrency} cart and "
+          f"{args.critical_concurrency} critical clients, {args.duration}s per run, latency target {args.target}s, "
+          f"order-service deadline {args.deadline}s\n")
+    print_table(["run", "shedding", "route", "ok/s", "shed 503", "late 504", "other errors", "ok p50 ms", "ok p99 ms"],
+                rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfume Store benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    compression = subparsers.add_parser("compression", help="bytes on the wire and CPU per catalog request")
+    compression.add_argument("--products", type=int, default=500)
+    compression.add_argument("--requests", type=int, default=200)
+    compression.set_defaults(func=bench_compression)
+
+    ratelimit = subparsers.add_parser("ratelimit", help="per-request overhead of the rate limiter")
+    ratelimit.add_argument("--requests", type=int, default=20000)
+    ratelimit.add_argument("--redis-url", help="also measure the Redis backend against this server")
+    ratelimit.set_defaults(func=bench_ratelimit)
+
+    workers = subparsers.add_parser("workers", help="throughput scaling from 1 to N gunicorn workers")
+    workers.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    workers.add_argument("--duration", type=float, default=10)
+    workers.add_argument("--products", type=int, default=100)
+    workers.add_argument("--path", default="/api/products")
+    workers.add_argument("--clients", type=int, default=2)
+    workers.add_argument("--concurrency", type=int, default=16)
+    workers.add_argument("--port", type=int, default=8901)
+    workers.set_defaults(func=bench_workers)
+
+    storefront = subparsers.add_parser("storefront", help="aggregated storefront endpoint vs fetch waterfall")
+    storefront.add_argument("--pages", type=int, default=200)
+    storefront.add_argument("--cart-items", type=int, default=3)
+    storefront.add_argument("--rtt-ms", type=float, default=50, help="latency added before each client request")
+    storefront.add_argument("--port", type=int, default=8911)
+    storefront.set_defaults(func=bench_storefront)
+
+    overload = subparsers.add_parser("overload", help="catalog flood vs cart and checkout, with and without shedding")
+    overload.add_argument("--duration", type=float, default=10)
+    overload.add_argument("--products", type=int, default=500)
+    overload.add_argument("--low-concurrency", type=int, default=96)
+    overload.add_argument("--cart-concurrency", type=int, default=16)
+    overload.add_argument("--critical-concurrency", type=int, default=8)
+    overload.add_argument("--deadline", type=float, default=2.0, help="X-Request-Deadline sent to order-service, s")
+    overload.add_argument("--target", type=float, default=0.25, help="LOADSHED_TARGET_SECONDS for the run")
+    overload.add_argument("--port", type=int, default=8921)
+    overload.set_defaults(func=bench_overload)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -59,7 +59,11 @@ pip install --quiet \
     "bcrypt==4.1.2" \
     "python-multipart==0.0.6" \
     "httpx==0.25.2" \
-    "sqlalchemy==2.0.23"
+    "sqlalchemy==2.0.23" \
+    "orjson==3.9.10" \
+    "brotli==1.1.0" \
+    "zstandard==0.22.0" \
+    "redis==5.0.1"
 
 echo -e "${GREEN}Dependencies installed.${NC}"
 echo ""
@@ -69,15 +73,16 @@ export JWT_SECRET_KEY="local-dev-secret-key-not-for-production"
 export CORS_ORIGINS="http://localhost:8080,http://localhost:3000,http://127.0.0.1:8080"
 export PRODUCT_SERVICE_URL="http://localhost:8001"
 export USER_SERVICE_URL="http://localhost:8003"
+export ORDER_SERVICE_URL="http://localhost:8002"
 
 # --- Step 4: Start Product Service (port 8001) ---
 echo -e "${CYAN}Starting Product Service on port 8001...${NC}"
-PORT=8001 python3 "$ROOT_DIR/applications/product-service/main.py" &
+DATABASE_REPLICA_URLS="${PRODUCT_REPLICA_URLS:-}" PORT=8001 python3 "$ROOT_DIR/applications/product-service/main.py" &
 PIDS+=($!)
 
 # --- Step 5: Start User Service (port 8003) ---
 echo -e "${CYAN}Starting User Service on port 8003...${NC}"
-PORT=8003 python3 "$ROOT_DIR/applications/user-service/main.py" &
+DATABASE_REPLICA_URLS="${USER_REPLICA_URLS:-}" PORT=8003 python3 "$ROOT_DIR/applications/user-service/main.py" &
 PIDS+=($!)
 
 # Short wait for services to be ready before starting order service
@@ -85,7 +90,7 @@ sleep 2
 
 # --- Step 6: Start Order Service (port 8002) ---
 echo -e "${CYAN}Starting Order Service on port 8002...${NC}"
-PORT=8002 python3 "$ROOT_DIR/applications/order-service/main.py" &
+DATABASE_REPLICA_URLS="${ORDER_REPLICA_URLS:-}" PORT=8002 python3 "$ROOT_DIR/applications/order-service/main.py" &
 PIDS+=($!)
 
 # --- Step 7: Start Frontend (port 8080) ---
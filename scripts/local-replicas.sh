@@ -0,0 +1,49 @@
+#!/bin/bash
+# =============================================================================
+# Perfume Store Platform - Local Read-Replica Runner
+# Snapshots each service's SQLite database into a replica file and starts the
+# stack with DATABASE_REPLICA_URLS pointing at the snapshots.
+# Replicas are not kept in sync: re-run this script to refresh them, which is
+# a handy way to see replica lag (new orders missing from order history).
+# =============================================================================
+
+set -e
+
+ROOT_DIR="$(cd "$(dirname "$0")/.." && pwd)"
+cd "$ROOT_DIR"
+
+# Colors
+GREEN='\033[0;32m'
+YELLOW='\033[1;33m'
+NC='\033[0m'
+
+snapshot() {
+    local name="$1"
+    if [ ! -f "${name}.db" ]; then
+        echo -e "${YELLOW}  ${name}.db not found - run 'make dev' once to create it${NC}"
+        return
+    fi
+    # sqlite3 backup API gives a consistent copy even while a service is writing
+    python3 - "$name" <<'PY'
+import sqlite3, sys
+name = sys.argv[1]
+src = sqlite3.connect(f"{name}.db")
+dst = sqlite3.connect(f"{name}-replica.db")
+src.backup(dst)
+dst.close()
+src.close()
+PY
+    echo -e "${GREEN}  ${name}.db -> ${name}-replica.db${NC}"
+}
+
+echo -e "${YELLOW}Snapshotting SQLite databases into replica files...${NC}"
+snapshot products
+snapshot users
+snapshot orders
+echo ""
+
+export PRODUCT_REPLICA_URLS="sqlite:///./products-replica.db"
+export USER_REPLICA_URLS="sqlite:///./users-replica.db"
+export ORDER_REPLICA_URLS="sqlite:///./orders-replica.db"
+
+exec "$ROOT_DIR/scripts/local-dev.sh"